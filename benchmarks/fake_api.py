@@ -0,0 +1,140 @@
+import asyncio
+import json
+import random
+import time
+from itertools import count
+
+from aiohttp import web
+
+BOT_ID = 1000
+BOT_USERNAME = "bench_bot"
+
+
+class FakeBotAPI:
+    """Minimal stand-in for the Telegram Bot API.
+
+    Serves `/bot<token>/<method>` like the real API. getUpdates hands out
+    updates pushed with `push_updates()`, and send methods answer with
+    plausible messages. Every call can be slowed down with `latency` (plus
+    up to `jitter` seconds) to model the round trip, every `rate_limit_every`-th send is rejected with
+    a 429, and sends to `blocked_users` fail with 403 like a user who
+    blocked the bot.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limit_every: int = 0,
+        retry_after: int = 1,
+        blocked_users: set[int] | None = None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.blocked_users = blocked_users or set()
+        self.calls: dict[str, int] = {}
+        self.sent = 0
+        self.rate_limited = 0
+        self.blocked = 0
+        self._message_ids = count(1)
+        self._send_counter = count(1)
+        self._updates: asyncio.Queue[dict] = asyncio.Queue()
+        self._runner: web.AppRunner | None = None
+
+    def push_updates(self, updates: list[dict]):
+        """Queue raw updates to be returned by getUpdates"""
+        for update in updates:
+            self._updates.put_nowait(update)
+
+    @staticmethod
+    def _ok(result) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    def _error(code: int, description: str, **parameters) -> web.Response:
+        body = {"ok": False, "error_code": code, "description": description}
+        if parameters:
+            body["parameters"] = parameters
+        return web.json_response(body, status=code)
+
+    def _message(self, chat_id: int, **content) -> dict:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bench", "username": BOT_USERNAME},
+            **content
+        }
+
+    async def _get_updates(self, request: web.Request, params) -> web.Response:
+        limit = int(params.get("limit", 100))
+        timeout = float(params.get("timeout", 0))
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(self._updates.get(), timeout=max(timeout, 0.01)))
+        except asyncio.TimeoutError:
+            return self._ok([])
+        if request.transport is None or request.transport.is_closing():
+            # The poller went away (e.g. a restarted bot), leave the update for the next one
+            self._updates.put_nowait(updates[0])
+            return self._ok([])
+        while len(updates) < limit and not self._updates.empty():
+            updates.append(self._updates.get_nowait())
+        return self._ok(updates)
+
+    async def _send(self, method: str, params) -> web.Response:
+        if self.rate_limit_every and next(self._send_counter) % self.rate_limit_every == 0:
+            self.rate_limited += 1
+            return self._error(
+                429,
+                f"Too Many Requests: retry after {self.retry_after}",
+                retry_after=self.retry_after
+            )
+        chat_id = int(params["chat_id"])
+        if chat_id in self.blocked_users:
+            self.blocked += 1
+            return self._error(403, "Forbidden: bot was blocked by the user")
+        self.sent += 1
+        if method == "copyMessage":
+            return self._ok({"message_id": next(self._message_ids)})
+        if method == "copyMessages":
+            return self._ok([{"message_id": next(self._message_ids)} for _ in json.loads(params["message_ids"])])
+        if method == "sendPhoto":
+            photo = [{"file_id": params["photo"], "file_unique_id": "bench", "width": 1, "height": 1}]
+            return self._ok(self._message(chat_id, photo=photo, caption=params.get("caption")))
+        return self._ok(self._message(chat_id, text=params.get("text", "")))
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        params = dict(await request.post())
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.random() * self.jitter)
+        if method == "getUpdates":
+            return await self._get_updates(request, params)
+        if method == "getMe":
+            return self._ok({"id": BOT_ID, "is_bot": True, "first_name": "Bench", "username": BOT_USERNAME})
+        if method in ("sendMessage", "sendPhoto", "sendVideo", "copyMessage", "copyMessages"):
+            return await self._send(method, params)
+        if method == "editMessageText":
+            return self._ok(self._message(int(params.get("chat_id", 0)), text=params.get("text", "")))
+        # deleteWebhook, answerCallbackQuery, setMyCommands, ...
+        return self._ok(True)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving and return the base URL for TELEGRAM_API_URL"""
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,66 @@
+"""Micro-benchmark: rebuilding reply keyboards per reply vs. frozen ones.
+
+Measures the time and memory allocated to build the keyboard and encode
+the outgoing sendMessage request:
+
+    python -m benchmarks.keyboards
+"""
+import argparse
+import time
+import tracemalloc
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import SendMessage
+
+from bot.keyboards.keyboards import build_main_menu_keyboard, get_main_menu_keyboard
+from bot.session import PreparedMarkupSession
+from bot.templates import get_text
+
+
+def rebuilt(session: AiohttpSession, bot: Bot):
+    """What every reply used to do: a new builder, a new markup, a fresh dump"""
+    method = SendMessage(chat_id=1, text=get_text("help"), reply_markup=build_main_menu_keyboard())
+    session.build_form_data(bot, method)
+
+
+def frozen(session: PreparedMarkupSession, bot: Bot):
+    """Shared markup whose JSON was serialized at import time"""
+    method = SendMessage(chat_id=1, text=get_text("help"), reply_markup=get_main_menu_keyboard())
+    session.build_form_data(bot, method)
+
+
+def measure(func, session, bot, iterations: int) -> tuple[float, int]:
+    """Microseconds per call, and peak memory allocated by one call"""
+    func(session, bot)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(session, bot)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(session, bot)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / iterations * 1e6, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    bot = Bot("123456:BENCHMARK")
+    results = {
+        "rebuilt": measure(rebuilt, AiohttpSession(), bot, args.iterations),
+        "frozen": measure(frozen, PreparedMarkupSession(), bot, args.iterations),
+    }
+    print(f"{'':<8} {'us/reply':>10} {'peak bytes/reply':>18}")
+    for name, (micros, peak) in results.items():
+        print(f"{name:<8} {micros:>10.1f} {peak:>18}")
+    saved = 1 - results["frozen"][0] / results["rebuilt"][0]
+    print(f"frozen keyboards save {saved:.0%} of the time spent preparing a reply")
+
+
+if __name__ == "__main__":
+    main()
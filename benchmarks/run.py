@@ -0,0 +1,350 @@
+"""Benchmark the bot against a fake Bot API.
+
+Replays synthetic update streams through the real dispatcher, routers and
+middlewares, and reports throughput and latency:
+
+    python -m benchmarks.run
+    python -m benchmarks.run --scenarios start tickets --users 5000 --json results.json
+    python -m benchmarks.run --baseline results.json   # exit 1 on a regression
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from itertools import count
+from pathlib import Path
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message, Update
+from sqlalchemy import func, insert, select
+
+from benchmarks.fake_api import FakeBotAPI
+from config import (
+    ArchiveConfig,
+    BotConfig,
+    BroadcastConfig,
+    Config,
+    DatabaseConfig,
+    FSMConfig,
+    MetricsConfig,
+    SLAConfig,
+    ThrottlingConfig,
+    TicketConfig,
+    WebhookConfig
+)
+from bot.services.broadcast import build_album_payload, build_payload
+from database import Database
+from database.models import BroadcastJob, User
+from main import close_dispatcher, create_bot, create_dispatcher
+
+ADMIN_ID = 1
+FIRST_USER_ID = 10_000_000
+SCENARIOS = ("start", "tickets", "polling", "broadcast", "album", "coldstart")
+ALBUM_SIZE = 3
+ROOT = Path(__file__).resolve().parent.parent
+
+_update_ids = count(1)
+_message_ids = count(1)
+
+
+def message_update(user_id: int, text: str) -> dict:
+    """Raw update with a private text message from `user_id`"""
+    return {
+        "update_id": next(_update_ids),
+        "message": {
+            "message_id": next(_message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+            "text": text,
+        },
+    }
+
+
+def source_message(caption: str | None = None, media_group_id: str | None = None) -> Message:
+    """A photo in the admin's chat, as the /broadcast handler receives it"""
+    message_id = next(_message_ids)
+    return Message.model_validate({
+        "message_id": message_id,
+        "date": int(time.time()),
+        "chat": {"id": ADMIN_ID, "type": "private"},
+        "from": {"id": ADMIN_ID, "is_bot": False, "first_name": "Admin"},
+        "photo": [{"file_id": f"photo-{message_id}", "file_unique_id": f"p{message_id}", "width": 1280, "height": 720}],
+        "caption": caption,
+        "media_group_id": media_group_id,
+    })
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(latencies: list[float], elapsed: float) -> dict:
+    return {
+        "updates": len(latencies),
+        "updates_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+async def replay(dp: Dispatcher, bot: Bot, flows: list[list[dict]], concurrency: int) -> dict:
+    """Feed each flow's updates in order; flows run `concurrency` at a time"""
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_flow(flow: list[dict]):
+        async with semaphore:
+            for raw in flow:
+                update = Update.model_validate(raw, context={"bot": bot})
+                start = time.perf_counter()
+                await dp.feed_update(bot, update)
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_flow(flow) for flow in flows))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def bench_start(dp: Dispatcher, bot: Bot, args, offset: int) -> dict:
+    """/start storm: every user registers at once"""
+    flows = [[message_update(FIRST_USER_ID + offset + i, "/start")] for i in range(args.users)]
+    return await replay(dp, bot, flows, args.concurrency)
+
+
+async def bench_tickets(dp: Dispatcher, bot: Bot, args, offset: int) -> dict:
+    """Complete ticket flows, each user going through every FSM step"""
+    flows = [
+        [
+            message_update(user_id, "/ticket"),
+            message_update(user_id, f"Cannot log in #{i}"),
+            message_update(user_id, f"Login page shows error {i % 97} after entering the code"),
+            message_update(user_id, "⏭ Skip"),
+        ]
+        for i, user_id in enumerate(range(FIRST_USER_ID + offset, FIRST_USER_ID + offset + args.users))
+    ]
+    return await replay(dp, bot, flows, args.concurrency)
+
+
+async def bench_polling(dp: Dispatcher, bot: Bot, api: FakeBotAPI, args, offset: int) -> dict:
+    """End to end through getUpdates and dp.start_polling()"""
+    sent_before = api.calls.get("sendMessage", 0)
+    api.push_updates([message_update(FIRST_USER_ID + offset + i, "/help") for i in range(args.users)])
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+    start = time.perf_counter()
+    while api.calls.get("sendMessage", 0) - sent_before < args.users:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    await dp.stop_polling()
+    await polling
+    return {"updates": args.users, "updates_per_s": round(args.users / elapsed, 1)}
+
+
+async def add_broadcast_users(db: Database, api: FakeBotAPI, args):
+    """`broadcast_users` fresh users, some of whom blocked the bot"""
+    first_id = FIRST_USER_ID * 10
+    ids = range(first_id, first_id + args.broadcast_users)
+    async with db.session_maker() as session:
+        for chunk_start in range(0, len(ids), 10_000):
+            chunk = ids[chunk_start:chunk_start + 10_000]
+            await session.execute(insert(User), [{"telegram_id": i, "is_active": True} for i in chunk])
+        await session.commit()
+    if args.blocked:
+        step = max(1, round(1 / args.blocked))
+        api.blocked_users.update(ids[::step])
+
+
+async def bench_broadcast(db: Database, dp: Dispatcher, api: FakeBotAPI, args, payload: dict) -> dict:
+    """Deliver `payload` to every active user, as queued by the /broadcast handler"""
+    async with db.session_maker() as session:
+        total = await session.scalar(select(func.count()).select_from(User).where(User.is_active == True))
+    sent_before, limited_before, blocked_before = api.sent, api.rate_limited, api.blocked
+    start = time.perf_counter()
+    job_id = await dp["broadcaster"].create(payload, admin_chat_id=ADMIN_ID, status_message_id=1, total=total)
+    while True:
+        await asyncio.sleep(0.2)
+        async with db.session_maker() as session:
+            status = await session.scalar(select(BroadcastJob.status).where(BroadcastJob.id == job_id))
+        if status not in ("queued", "running"):
+            break
+    elapsed = time.perf_counter() - start
+    return {
+        "status": status,
+        "messages": api.sent - sent_before,
+        "rate_limited": api.rate_limited - limited_before,
+        "blocked": api.blocked - blocked_before,
+        "sends_per_s": round((api.sent - sent_before) / elapsed, 1),
+    }
+
+
+async def bench_coldstart(api: FakeBotAPI, api_url: str, database_url: str, args) -> dict:
+    """Time from spawning main.py (polling, schema up to date) to its first reply"""
+    timings = []
+    for run in range(args.coldstart_runs):
+        env = dict(
+            os.environ,
+            BOT_TOKEN="123456:BENCHMARK",
+            TELEGRAM_API_URL=api_url,
+            DATABASE_URL=database_url,
+            RUN_MODE="polling",
+            WORKERS="0",
+            METRICS_ENABLED="false"
+        )
+        sent_before = api.sent
+        api.push_updates([message_update(FIRST_USER_ID - 1 - run, "/start")])
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "main.py",
+            cwd=ROOT,
+            env=env,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            while api.sent == sent_before:
+                if process.returncode is not None:
+                    raise RuntimeError(f"main.py exited with code {process.returncode}")
+                await asyncio.sleep(0.005)
+            timings.append(time.perf_counter() - start)
+        finally:
+            if process.returncode is None:
+                process.terminate()
+            await process.wait()
+    return {
+        "runs": len(timings),
+        "first_reply_ms": round(statistics.median(timings) * 1000, 1),
+        "min_ms": round(min(timings) * 1000, 1),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of more than `tolerance` against a previous run"""
+    regressions = []
+    for scenario, metrics in results.items():
+        for name, value in metrics.items():
+            old = baseline.get(scenario, {}).get(name)
+            if not isinstance(old, (int, float)) or not old:
+                continue
+            if name.endswith("_per_s") and value < old * (1 - tolerance):
+                regressions.append(f"{scenario}.{name}: {value} < {old}")
+            elif name.endswith("_ms") and value > old * (1 + tolerance):
+                regressions.append(f"{scenario}.{name}: {value} > {old}")
+    return regressions
+
+
+async def run(args) -> dict:
+    api = FakeBotAPI(
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit_every=args.rate_limit_every
+    )
+    api_url = await api.start()
+    workdir = tempfile.TemporaryDirectory()
+    database_url = args.database_url or f"sqlite+aiosqlite:///{Path(workdir.name) / 'bench.db'}"
+    config = Config(
+        bot=BotConfig(token="123456:BENCHMARK", admin_ids=[ADMIN_ID], api_url=api_url),
+        db=DatabaseConfig(url=database_url),
+        broadcast=BroadcastConfig(rate_limit=args.broadcast_rate, workers=args.broadcast_workers, progress_interval=1.0),
+        webhook=WebhookConfig(),
+        fsm=FSMConfig(backend=args.fsm),
+        throttling=ThrottlingConfig(),
+        tickets=TicketConfig(),
+        metrics=MetricsConfig(enabled=args.metrics),
+        archive=ArchiveConfig(),
+        sla=SLAConfig()
+    )
+    db = Database.from_config(config.db)
+    await db.run_migrations()
+    bot = create_bot(config)
+    dp = await create_dispatcher(config, bot, db)
+
+    results = {}
+    users_added = False
+    try:
+        # Each scenario gets its own range of user IDs
+        for offset, scenario in enumerate(args.scenarios):
+            offset *= args.users
+            print(f"Running {scenario}...", file=sys.stderr)
+            if scenario == "start":
+                results[scenario] = await bench_start(dp, bot, args, offset)
+            elif scenario == "tickets":
+                results[scenario] = await bench_tickets(dp, bot, args, offset)
+            elif scenario == "polling":
+                results[scenario] = await bench_polling(dp, bot, api, args, offset)
+            elif scenario in ("broadcast", "album"):
+                if not users_added:
+                    await add_broadcast_users(db, api, args)
+                    users_added = True
+                if scenario == "broadcast":
+                    # A captioned photo: copied with copyMessage, header prepended to the caption
+                    payload = build_payload(source_message(caption="Scheduled <b>maintenance</b> tonight"))
+                else:
+                    # Copied with one copyMessages call per user
+                    group = f"album-{next(_message_ids)}"
+                    payload = build_album_payload([
+                        source_message(media_group_id=group) for _ in range(ALBUM_SIZE)
+                    ])
+                results[scenario] = await bench_broadcast(db, dp, api, args, payload)
+            elif scenario == "coldstart":
+                results[scenario] = await bench_coldstart(api, api_url, database_url, args)
+    finally:
+        await close_dispatcher(dp)
+        await dp.storage.close()
+        await bot.session.close()
+        await db.engine.dispose()
+        await api.stop()
+        workdir.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot against a fake Bot API")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--users", type=int, default=2000, help="users per update scenario")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=10,
+        help="users handled concurrently; SQLite serializes writes, so raise this on PostgreSQL only"
+    )
+    parser.add_argument("--broadcast-users", type=int, default=100_000)
+    parser.add_argument("--broadcast-rate", type=float, default=10_000, help="messages per second")
+    parser.add_argument("--broadcast-workers", type=int, default=100)
+    parser.add_argument("--blocked", type=float, default=0.05, help="fraction of users who blocked the bot")
+    parser.add_argument("--coldstart-runs", type=int, default=3, help="bot restarts timed by coldstart")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake API round trip in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency in seconds")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth send with a 429")
+    parser.add_argument("--fsm", choices=("database", "memory"), default="database")
+    parser.add_argument("--metrics", action="store_true", help="enable metrics instrumentation")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite database")
+    parser.add_argument("--json", type=Path, help="write the results to this file")
+    parser.add_argument("--baseline", type=Path, help="compare with a previous --json output")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression, 0.2 = 20%%")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results = asyncio.run(run(args))
+
+    for scenario, metrics in results.items():
+        print(f"{scenario:<10} " + "  ".join(f"{name}={value}" for name, value in metrics.items()))
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.services.cache import TTLCache
+from config import FSMConfig
+from database.models import FSMRecord
+from database.upsert import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+CLEANUP_INTERVAL = 600.0
+CLEANUP_BATCH_SIZE = 1000
+CACHE_MAXSIZE = 100_000
+
+
+class DatabaseStorage(BaseStorage):
+    """FSM storage kept in the `fsm_states` table.
+
+    Writes are buffered and flushed as multi-row upserts every
+    `flush_interval` seconds (or sooner once `batch_size` keys are dirty).
+    Records expire `ttl` seconds after their last write.
+
+    Reads see this process's buffered writes first, then a read-through
+    cache of records (including missing ones) kept for `cache_ttl`
+    seconds, so most updates need no query at all. Within one process a
+    user's state is therefore always consistent; a change made by another
+    process may take up to `cache_ttl` seconds to show, so use 0 when
+    several processes can handle the same user.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        ttl: float = 86400,
+        flush_interval: float = 0.1,
+        batch_size: int = 500,
+        key_builder: Optional[KeyBuilder] = None,
+        cache_ttl: float = 60
+    ):
+        self.session_maker = session_maker
+        self.ttl = timedelta(seconds=ttl)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        # key -> {"state": ..., "data": ...} with only the fields that changed
+        self._dirty: Dict[str, Dict[str, Any]] = {}
+        self._flushing: Dict[str, Dict[str, Any]] = {}
+        # key -> {"state": ..., "data": ...} as last read, or written since
+        self._cache = TTLCache(maxsize=CACHE_MAXSIZE, ttl=cache_ttl) if cache_ttl > 0 else None
+        # Bumped on every write, so a read that raced with one isn't cached
+        self._writes = 0
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    def _ensure_started(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._flush_loop()),
+                asyncio.create_task(self._cleanup_loop()),
+            ]
+
+    def _write(self, key: StorageKey, field: str, value: Any):
+        self._ensure_started()
+        storage_key = self.key_builder.build(key)
+        self._dirty.setdefault(storage_key, {})[field] = value
+        self._writes += 1
+        if self._cache is not None:
+            cached = self._cache.get(storage_key)
+            if cached is not None:
+                cached[field] = value
+        if len(self._dirty) >= self.batch_size:
+            self._wakeup.set()
+
+    def _buffered(self, key: str, field: str) -> tuple[bool, Any]:
+        for buffer in (self._dirty, self._flushing):
+            fields = buffer.get(key)
+            if fields is not None and field in fields:
+                return True, fields[field]
+        return False, None
+
+    async def _read(self, key: StorageKey, field: str) -> Any:
+        storage_key = self.key_builder.build(key)
+        found, value = self._buffered(storage_key, field)
+        if found:
+            return value
+        if self._cache is not None:
+            cached = self._cache.get(storage_key)
+            if cached is not None:
+                return cached[field]
+        writes = self._writes
+        # Both fields at once: handlers usually read the state and then the data
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(FSMRecord.state, FSMRecord.data).where(
+                    FSMRecord.key == storage_key,
+                    FSMRecord.expires_at > datetime.utcnow()
+                )
+            )
+            row = result.first()
+        record = {"state": row.state, "data": row.data} if row is not None else {"state": None, "data": None}
+        if self._cache is not None and self._writes == writes:
+            self._cache.set(storage_key, record)
+        return record[field]
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._write(key, "state", state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self._read(key, "state")
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        self._write(key, "data", data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        data = await self._read(key, "data")
+        return dict(data) if data else {}
+
+    async def flush(self):
+        """Write all buffered changes to the database"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            self._flushing, self._dirty = self._dirty, {}
+            expires_at = datetime.utcnow() + self.ttl
+            # One multi-row upsert per combination of changed fields
+            groups: Dict[tuple[str, ...], list[dict]] = {}
+            for key, fields in self._flushing.items():
+                groups.setdefault(tuple(sorted(fields)), []).append(
+                    {"key": key, "expires_at": expires_at, **fields}
+                )
+            try:
+                async with self.session_maker() as session:
+                    for fields, rows in groups.items():
+                        statement = dialect_insert(session, FSMRecord).values(rows)
+                        statement = statement.on_conflict_do_update(
+                            index_elements=[FSMRecord.key],
+                            set_={
+                                column: statement.excluded[column]
+                                for column in (*fields, "expires_at")
+                            }
+                        )
+                        await session.execute(statement)
+                    await session.commit()
+            except Exception:
+                # Put the changes back unless they were overwritten meanwhile
+                for key, fields in self._flushing.items():
+                    self._dirty[key] = {**fields, **self._dirty.get(key, {})}
+                raise
+            finally:
+                self._flushing = {}
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush FSM states")
+
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(CLEANUP_INTERVAL)
+            try:
+                await self.delete_expired()
+            except Exception:
+                logger.exception("Failed to delete expired FSM states")
+
+    async def delete_expired(self) -> int:
+        """Delete expired records in small batches to keep locks short"""
+        deleted = 0
+        while True:
+            async with self.session_maker() as session:
+                expired = (
+                    select(FSMRecord.key)
+                    .where(FSMRecord.expires_at <= datetime.utcnow())
+                    .limit(CLEANUP_BATCH_SIZE)
+                    .scalar_subquery()
+                )
+                result = await session.execute(delete(FSMRecord).where(FSMRecord.key.in_(expired)))
+                await session.commit()
+            deleted += result.rowcount
+            if result.rowcount < CLEANUP_BATCH_SIZE:
+                return deleted
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
+
+
+def create_storage(config: FSMConfig, session_maker: async_sessionmaker[AsyncSession]) -> BaseStorage:
+    """Build the FSM storage backend selected in the configuration"""
+    if config.backend == "database":
+        return DatabaseStorage(
+            session_maker,
+            ttl=config.ttl,
+            flush_interval=config.flush_interval,
+            cache_ttl=config.cache_ttl
+        )
+    if config.backend == "redis":
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+        except ImportError as e:
+            raise RuntimeError("The redis FSM backend requires the `redis` package (pip install redis)") from e
+        # Works with any Redis-compatible server (Redis, Valkey, KeyDB, ...)
+        return RedisStorage.from_url(
+            config.redis_url,
+            key_builder=DefaultKeyBuilder(with_destiny=True),
+            state_ttl=int(config.ttl),
+            data_ttl=int(config.ttl)
+        )
+    return MemoryStorage()
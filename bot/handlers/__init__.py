@@ -1,3 +1,3 @@
-from bot.handlers import basic, support, admin
+from bot.handlers import basic, support, admin, relay
 
-__all__ = ["basic", "support", "admin"]
+__all__ = ["basic", "support", "admin", "relay"]
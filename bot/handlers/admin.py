@@ -1,15 +1,50 @@
-from aiogram import Router, F
-from aiogram.filters import Command, StateFilter
+import asyncio
+import logging
+from html import escape
+
+from aiogram import Router, F, flags
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import Message
-from sqlalchemy import select
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+from aiogram.types import CallbackQuery, Message
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.models import User
-from bot.keyboards.keyboards import get_cancel_keyboard, get_main_menu_keyboard
+from database import Database
+from database.models import SupportTicket, User
+from bot.keyboards.keyboards import (
+    SearchPage,
+    TicketAction,
+    TicketPage,
+    TicketView,
+    get_cancel_keyboard,
+    get_main_menu_keyboard,
+    get_search_results_keyboard,
+    get_ticket_actions_keyboard,
+    get_ticket_list_keyboard
+)
+from bot.services.broadcast import Broadcaster, build_album_payload, build_payload
+from bot.services.search import TicketSearch
+from bot.services.sla import SLAScheduler
+from bot.services.stats import get_stats
+from bot.services.tickets import TICKET_STATUSES, list_tickets, transition_ticket
+from bot.templates import get_text, variants
 
 router = Router()
+logger = logging.getLogger(__name__)
+
+TICKETS_PAGE_SIZE = 5
+# Telegram delivers the parts of an album as separate updates in quick succession
+ALBUM_WAIT = 1.0
+# (chat_id, media_group_id) -> album parts received so far
+_pending_albums: dict[tuple[int, str], list[Message]] = {}
+_album_tasks: set[asyncio.Task] = set()
+TICKET_NOTIFICATIONS = {
+    "claim": "👀 Your ticket #{id} is now being handled by our support team.",
+    "resolve": "✅ Your ticket #{id} has been resolved.",
+    "close": "🔒 Your ticket #{id} has been closed.",
+}
 
 
 class BroadcastStates(StatesGroup):
@@ -22,22 +57,18 @@ def is_admin(user_id: int, admin_ids: list[int]) -> bool:
 
 
 @router.message(Command("admin"))
+@flags.no_session
 async def cmd_admin(message: Message, admin_ids: list[int]):
     """Show admin panel"""
     if not is_admin(message.from_user.id, admin_ids):
         await message.answer("❌ You don't have permission to access the admin panel.")
         return
     
-    admin_text = (
-        "🔐 <b>Admin Panel</b>\n\n"
-        "<b>Available Commands:</b>\n"
-        "/broadcast - Send a message to all users\n"
-        "/stats - View bot statistics\n"
-    )
-    await message.answer(admin_text, parse_mode="HTML")
+    await message.answer(get_text("admin_panel"), parse_mode="HTML")
 
 
 @router.message(Command("broadcast"))
+@flags.no_session
 async def start_broadcast(message: Message, state: FSMContext, admin_ids: list[int]):
     """Start broadcast message process"""
     if not is_admin(message.from_user.id, admin_ids):
@@ -48,10 +79,8 @@ async def start_broadcast(message: Message, state: FSMContext, admin_ids: list[i
     await message.answer(
         "📢 <b>Broadcast Message</b>\n\n"
         "Send me the message you want to broadcast to all users.\n\n"
-        "You can send:\n"
-        "• Text messages\n"
-        "• Photos with captions\n"
-        "• Videos with captions\n\n"
+        "You can send any message: text, photos, videos, documents, "
+        "voice messages, stickers or a whole album.\n\n"
         "Use /cancel to cancel the broadcast.",
         parse_mode="HTML",
         reply_markup=get_cancel_keyboard()
@@ -59,7 +88,8 @@ async def start_broadcast(message: Message, state: FSMContext, admin_ids: list[i
 
 
 @router.message(BroadcastStates.waiting_for_message, Command("cancel"))
-@router.message(BroadcastStates.waiting_for_message, F.text == "❌ Cancel")
+@router.message(BroadcastStates.waiting_for_message, F.text.in_(variants("button_cancel")))
+@flags.no_session
 async def cancel_broadcast(message: Message, state: FSMContext):
     """Cancel broadcast"""
     await state.clear()
@@ -70,101 +100,373 @@ async def cancel_broadcast(message: Message, state: FSMContext):
 
 
 @router.message(BroadcastStates.waiting_for_message)
-async def process_broadcast(message: Message, state: FSMContext, session: AsyncSession, admin_ids: list[int]):
-    """Process and send broadcast message"""
+async def process_broadcast(
+    message: Message,
+    state: FSMContext,
+    session: AsyncSession,
+    admin_ids: list[int],
+    broadcaster: Broadcaster
+):
+    """Queue broadcast message for background delivery"""
     if not is_admin(message.from_user.id, admin_ids):
         await state.clear()
         await message.answer("❌ You don't have permission to broadcast messages.")
         return
     
-    # Get all active users
-    result = await session.execute(
-        select(User).where(User.is_active == True)
+    if message.media_group_id:
+        # Collected without awaiting, so every part lands in the same album
+        album = (message.chat.id, message.media_group_id)
+        if album in _pending_albums:
+            _pending_albums[album].append(message)
+            return
+        _pending_albums[album] = [message]
+        # Handlers must not wait here: in worker mode they hold up the admin's other updates
+        task = asyncio.create_task(queue_album(album, state, broadcaster))
+        _album_tasks.add(task)
+        task.add_done_callback(_album_tasks.discard)
+        return
+    
+    await queue_broadcast(message, state, session, broadcaster, build_payload(message))
+
+
+async def queue_album(key: tuple[int, str], state: FSMContext, broadcaster: Broadcaster):
+    """Queue an album once all of its parts have arrived"""
+    await asyncio.sleep(ALBUM_WAIT)
+    try:
+        messages = _pending_albums.pop(key, None)
+        if not messages:
+            return
+        # The handler's session is long closed by now
+        async with broadcaster.session_maker() as session:
+            await queue_broadcast(messages[0], state, session, broadcaster, build_album_payload(messages))
+    except Exception:
+        logger.exception("Failed to queue an album broadcast")
+
+
+async def queue_broadcast(
+    message: Message,
+    state: FSMContext,
+    session: AsyncSession,
+    broadcaster: Broadcaster,
+    payload: dict
+):
+    """Count the recipients, create the broadcast job and tell the admin how to control it"""
+    # Count active users; recipients are streamed by the broadcaster
+    active_users = await session.scalar(
+        select(func.count()).select_from(User).where(User.is_active == True)
     )
-    users = result.scalars().all()
     
-    if not users:
+    if not active_users:
         await state.clear()
         await message.answer("❌ No active users found.")
         return
     
-    # Send confirmation
+    await state.clear()
     await message.answer(
-        f"📢 Broadcasting to {len(users)} users...\n"
-        "Please wait..."
+        f"📢 Broadcast queued for {active_users} users.",
+        reply_markup=get_main_menu_keyboard()
+    )
+    status_message = await message.answer("⏳ Preparing broadcast...")
+    job_id = await broadcaster.create(payload, message.chat.id, status_message.message_id, active_users)
+    await message.answer(
+        f"🆔 Broadcast #{job_id}\n"
+        f"Use /pause_broadcast {job_id} or /cancel_broadcast {job_id} to control it."
     )
+
+
+@router.message(Command("broadcasts"))
+@flags.no_session
+async def cmd_broadcasts(message: Message, admin_ids: list[int], broadcaster: Broadcaster):
+    """List recent broadcast jobs"""
+    if not is_admin(message.from_user.id, admin_ids):
+        await message.answer("❌ You don't have permission to manage broadcasts.")
+        return
     
-    # Broadcast message
-    success_count = 0
-    fail_count = 0
+    jobs = await broadcaster.list_jobs()
+    if not jobs:
+        await message.answer("📭 No broadcasts yet.")
+        return
     
-    for user in users:
-        try:
-            if message.text:
-                await message.bot.send_message(
-                    chat_id=user.telegram_id,
-                    text=f"📢 <b>Broadcast Message</b>\n\n{message.text}",
-                    parse_mode="HTML"
-                )
-            elif message.photo:
-                await message.bot.send_photo(
-                    chat_id=user.telegram_id,
-                    photo=message.photo[-1].file_id,
-                    caption=f"📢 <b>Broadcast Message</b>\n\n{message.caption or ''}",
-                    parse_mode="HTML"
-                )
-            elif message.video:
-                await message.bot.send_video(
-                    chat_id=user.telegram_id,
-                    video=message.video.file_id,
-                    caption=f"📢 <b>Broadcast Message</b>\n\n{message.caption or ''}",
-                    parse_mode="HTML"
-                )
-            success_count += 1
-        except Exception as e:
-            fail_count += 1
-            # If user blocked the bot, deactivate them
-            if "blocked" in str(e).lower():
-                user.is_active = False
-    
-    await session.commit()
-    await state.clear()
+    lines = ["📢 <b>Recent Broadcasts</b>\n"]
+    for job in jobs:
+        lines.append(
+            f"#{job.id} — {job.status} — {job.sent + job.failed}/{job.total} "
+            f"({job.created_at:%Y-%m-%d %H:%M})"
+        )
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
+@router.message(Command("pause_broadcast", "resume_broadcast", "cancel_broadcast"))
+@flags.no_session
+async def cmd_control_broadcast(
+    message: Message,
+    command: CommandObject,
+    admin_ids: list[int],
+    broadcaster: Broadcaster
+):
+    """Pause, resume or cancel a broadcast job"""
+    if not is_admin(message.from_user.id, admin_ids):
+        await message.answer("❌ You don't have permission to manage broadcasts.")
+        return
     
-    # Send report
-    report = (
-        "✅ <b>Broadcast completed!</b>\n\n"
-        f"📊 <b>Statistics:</b>\n"
-        f"✅ Sent successfully: {success_count}\n"
-        f"❌ Failed: {fail_count}\n"
-        f"👥 Total users: {len(users)}"
-    )
-    await message.answer(report, parse_mode="HTML", reply_markup=get_main_menu_keyboard())
+    if not command.args or not command.args.strip().isdigit():
+        await message.answer(f"Usage: /{command.command} &lt;broadcast id&gt;", parse_mode="HTML")
+        return
+    
+    job_id = int(command.args.strip())
+    if command.command == "pause_broadcast":
+        changed, action = await broadcaster.pause(job_id), "paused"
+    elif command.command == "resume_broadcast":
+        changed, action = await broadcaster.resume(job_id), "resumed"
+    else:
+        changed, action = await broadcaster.cancel(job_id), "cancelled"
+    
+    if changed:
+        await message.answer(f"✅ Broadcast #{job_id} {action}.")
+    else:
+        await message.answer(f"❌ Broadcast #{job_id} can't be {action} in its current state.")
 
 
 @router.message(Command("stats"))
-async def cmd_stats(message: Message, session: AsyncSession, admin_ids: list[int]):
+async def cmd_stats(message: Message, session: AsyncSession, admin_ids: list[int], db: Database):
     """Show bot statistics"""
     if not is_admin(message.from_user.id, admin_ids):
         await message.answer("❌ You don't have permission to view statistics.")
         return
     
-    # Get user count
-    result = await session.execute(select(User))
-    total_users = len(result.scalars().all())
+    stats = await get_stats(session)
+    
+    lines = [
+        "📊 <b>Bot Statistics</b>\n",
+        f"👥 Total users: {stats.total_users}",
+        f"✅ Active users: {stats.active_users}",
+        f"📝 Total tickets: {stats.total_tickets}",
+    ]
+    if stats.tickets_by_status:
+        lines.append("\n<b>Tickets by status:</b>")
+        lines.extend(f"• {status}: {count}" for status, count in stats.tickets_by_status.items())
+    if stats.tickets_by_day:
+        lines.append("\n<b>Tickets per day:</b>")
+        lines.extend(f"• {day}: {count}" for day, count in stats.tickets_by_day.items())
+    pool = db.pool_status()
+    if pool:
+        lines.append(
+            f"\n🔌 DB pool: {pool['checked_out']}/{pool['capacity']} connections in use "
+            f"({pool['utilisation']:.0%})"
+        )
+    lines.append(f"\n<i>Updated {stats.generated_at:%H:%M:%S} UTC</i>")
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
+async def render_ticket_page(session: AsyncSession, status: str, after_id: int | None = None):
+    """Text and keyboard for one page of the ticket queue"""
+    tickets = await list_tickets(session, status, after_id, limit=TICKETS_PAGE_SIZE + 1)
+    has_more = len(tickets) > TICKETS_PAGE_SIZE
+    tickets = tickets[:TICKETS_PAGE_SIZE]
+    
+    if tickets:
+        lines = [f"🎫 <b>Tickets: {status}</b>\n"]
+        lines.extend(
+            f"#{ticket.id} — {escape(ticket.subject)} ({ticket.created_at:%Y-%m-%d %H:%M})"
+            + (f" 🔁 #{ticket.duplicate_of}" if ticket.duplicate_of else "")
+            for ticket in tickets
+        )
+        text = "\n".join(lines)
+    else:
+        text = f"🎫 <b>Tickets: {status}</b>\n\nNo tickets here."
+    return text, get_ticket_list_keyboard(tickets, status, has_more)
+
+
+def format_ticket(ticket: SupportTicket) -> str:
+    """Detailed ticket card for admins"""
+    lines = [
+        f"🎫 <b>Ticket #{ticket.id}</b>\n",
+        f"📝 Subject: {escape(ticket.subject)}",
+        f"📄 Description: {escape(ticket.description)}",
+        f"👤 User ID: {ticket.user_id}",
+        f"📌 Status: {ticket.status}",
+    ]
+    if ticket.duplicate_of:
+        lines.append(f"🔁 Duplicate of #{ticket.duplicate_of}")
+    if ticket.contact_info:
+        lines.append(f"📧 Contact: {escape(ticket.contact_info)}")
+    if ticket.assigned_to:
+        lines.append(f"🙋 Assigned to: {ticket.assigned_to}")
+    lines.append(f"🕒 Created: {ticket.created_at:%Y-%m-%d %H:%M}")
+    return "\n".join(lines)
+
+
+async def edit_card(message: Message, text: str, reply_markup):
+    """Replace an admin card in place; clicking the button of what's already shown is a no-op"""
+    try:
+        await message.edit_text(text, parse_mode="HTML", reply_markup=reply_markup)
+    except TelegramBadRequest as e:
+        if "message is not modified" not in e.message.lower():
+            raise
+
+
+@router.message(Command("tickets"))
+async def cmd_tickets(message: Message, command: CommandObject, session: AsyncSession, admin_ids: list[int]):
+    """Show the support ticket queue"""
+    if not is_admin(message.from_user.id, admin_ids):
+        await message.answer("❌ You don't have permission to view tickets.")
+        return
+    
+    status = (command.args or "open").strip()
+    if status not in TICKET_STATUSES:
+        await message.answer(f"Usage: /tickets [{' | '.join(TICKET_STATUSES)}]")
+        return
     
-    # Get active user count
-    result = await session.execute(select(User).where(User.is_active == True))
-    active_users = len(result.scalars().all())
+    text, keyboard = await render_ticket_page(session, status)
+    await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.callback_query(TicketPage.filter())
+async def show_ticket_page(
+    callback: CallbackQuery,
+    callback_data: TicketPage,
+    session: AsyncSession,
+    admin_ids: list[int]
+):
+    """Switch the ticket queue page or status"""
+    if not is_admin(callback.from_user.id, admin_ids):
+        await callback.answer("❌ You don't have permission to view tickets.", show_alert=True)
+        return
     
-    # Get ticket count
-    from database.models import SupportTicket
-    result = await session.execute(select(SupportTicket))
-    total_tickets = len(result.scalars().all())
+    await callback.answer()
+    text, keyboard = await render_ticket_page(session, callback_data.status, callback_data.after_id or None)
+    await edit_card(callback.message, text, keyboard)
+
+
+async def render_search_page(session: AsyncSession, search: TicketSearch, query: str, page: int = 0):
+    """Text and keyboard for one page of ticket search results"""
+    tickets = await search.search(
+        session,
+        query,
+        offset=page * TICKETS_PAGE_SIZE,
+        limit=TICKETS_PAGE_SIZE + 1
+    )
+    has_more = len(tickets) > TICKETS_PAGE_SIZE
+    tickets = tickets[:TICKETS_PAGE_SIZE]
     
-    stats_text = (
-        "📊 <b>Bot Statistics</b>\n\n"
-        f"👥 Total users: {total_users}\n"
-        f"✅ Active users: {active_users}\n"
-        f"📝 Total tickets: {total_tickets}\n"
+    if tickets:
+        lines = [f"🔎 <b>Search: {escape(query)}</b> (page {page + 1})\n"]
+        lines.extend(
+            f"#{ticket.id} — {escape(ticket.subject)} [{ticket.status}]"
+            for ticket in tickets
+        )
+        text = "\n".join(lines)
+    else:
+        text = f"🔎 <b>Search: {escape(query)}</b>\n\nNo tickets found."
+    return text, get_search_results_keyboard(tickets, page, has_more)
+
+
+@router.message(Command("search"))
+async def cmd_search(
+    message: Message,
+    command: CommandObject,
+    state: FSMContext,
+    session: AsyncSession,
+    admin_ids: list[int],
+    search: TicketSearch
+):
+    """Search tickets by subject and description"""
+    if not is_admin(message.from_user.id, admin_ids):
+        await message.answer("❌ You don't have permission to search tickets.")
+        return
+    
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("Usage: /search &lt;text&gt;", parse_mode="HTML")
+        return
+    
+    await state.update_data(search_query=query)
+    text, keyboard = await render_search_page(session, search, query)
+    await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@router.callback_query(SearchPage.filter())
+async def show_search_page(
+    callback: CallbackQuery,
+    callback_data: SearchPage,
+    state: FSMContext,
+    session: AsyncSession,
+    admin_ids: list[int],
+    search: TicketSearch
+):
+    """Switch the ticket search results page"""
+    if not is_admin(callback.from_user.id, admin_ids):
+        await callback.answer("❌ You don't have permission to search tickets.", show_alert=True)
+        return
+    
+    query = (await state.get_data()).get("search_query")
+    if not query:
+        await callback.answer("Search expired, please run /search again.", show_alert=True)
+        return
+    
+    await callback.answer()
+    text, keyboard = await render_search_page(session, search, query, callback_data.page)
+    await edit_card(callback.message, text, keyboard)
+
+
+@router.callback_query(TicketView.filter())
+async def show_ticket(
+    callback: CallbackQuery,
+    callback_data: TicketView,
+    session: AsyncSession,
+    admin_ids: list[int]
+):
+    """Show a single ticket with its available actions"""
+    if not is_admin(callback.from_user.id, admin_ids):
+        await callback.answer("❌ You don't have permission to view tickets.", show_alert=True)
+        return
+    
+    ticket = await session.get(SupportTicket, callback_data.ticket_id)
+    if ticket is None:
+        await callback.answer("❌ Ticket not found.", show_alert=True)
+        return
+    
+    await callback.answer()
+    await edit_card(callback.message, format_ticket(ticket), get_ticket_actions_keyboard(ticket))
+
+
+@router.callback_query(TicketAction.filter())
+async def change_ticket_status(
+    callback: CallbackQuery,
+    callback_data: TicketAction,
+    session: AsyncSession,
+    admin_ids: list[int],
+    sla: SLAScheduler
+):
+    """Claim, resolve or close a ticket"""
+    if not is_admin(callback.from_user.id, admin_ids):
+        await callback.answer("❌ You don't have permission to manage tickets.", show_alert=True)
+        return
+    if callback_data.action not in TICKET_NOTIFICATIONS:
+        await callback.answer("❌ Unknown action.", show_alert=True)
+        return
+    
+    ticket = await transition_ticket(
+        session,
+        callback_data.ticket_id,
+        callback_data.action,
+        callback.from_user.id,
+        sla=sla
     )
-    await message.answer(stats_text, parse_mode="HTML")
+    if ticket is None:
+        # Someone else changed it first; show the current state
+        await callback.answer("⚠️ This ticket was already updated by someone else.", show_alert=True)
+        ticket = await session.get(SupportTicket, callback_data.ticket_id)
+        if ticket is None:
+            return
+    else:
+        await callback.answer(f"✅ Ticket #{ticket.id}: {ticket.status}")
+        try:
+            await callback.bot.send_message(
+                ticket.user_id,
+                TICKET_NOTIFICATIONS[callback_data.action].format(id=ticket.id)
+            )
+        except TelegramAPIError:
+            pass
+    
+    await edit_card(callback.message, format_ticket(ticket), get_ticket_actions_keyboard(ticket))
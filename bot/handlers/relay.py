@@ -0,0 +1,42 @@
+from aiogram import Router, F, flags
+from aiogram.enums import ChatType
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.filters import StateFilter
+from aiogram.types import Message
+
+from bot.services.relay import TicketRelay
+
+router = Router()
+
+
+def in_support_chat(message: Message, relay: TicketRelay) -> bool:
+    """Check if a message was sent in the support chat"""
+    return relay.enabled and message.chat.id == relay.support_chat_id
+
+
+@router.message(in_support_chat, F.reply_to_message)
+@flags.no_session
+async def relay_support_reply(message: Message, relay: TicketRelay):
+    """Send a support chat reply to the ticket owner"""
+    target = await relay.lookup(message.chat.id, message.reply_to_message.message_id)
+    if target is None:
+        return
+    
+    try:
+        await relay.to_user(message, target)
+    except TelegramForbiddenError:
+        await message.reply(f"⚠️ Couldn't deliver the reply: the author of ticket #{target.ticket_id} has blocked the bot.")
+
+
+@router.message(F.chat.type == ChatType.PRIVATE, F.reply_to_message, StateFilter(None))
+@flags.no_session
+async def relay_user_reply(message: Message, relay: TicketRelay):
+    """Send a user's follow-up to the ticket thread in the support chat"""
+    if not relay.enabled:
+        return
+    
+    target = await relay.lookup(message.chat.id, message.reply_to_message.message_id)
+    if target is None:
+        return
+    
+    await relay.to_support(message, target)
@@ -1,128 +1,177 @@
-from aiogram import Router, F
+import logging
+from html import escape
+
+from aiogram import Router, F, flags
+from aiogram.exceptions import TelegramAPIError
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.models import SupportTicket
+from bot.handlers.admin import format_ticket
+from bot.services.duplicates import DuplicateDetector
+from bot.services.relay import TicketRelay
+from bot.services.tickets import CONTACT_MAX_LENGTH, SUBJECT_MAX_LENGTH, TicketService
 from bot.states.support import SupportTicketStates
+from bot.templates import get_text, resolve_locale, variants
 from bot.keyboards.keyboards import (
     get_cancel_keyboard,
     get_skip_keyboard,
-    get_main_menu_keyboard
+    get_main_menu_keyboard,
+    get_ticket_actions_keyboard
 )
 
+logger = logging.getLogger(__name__)
 router = Router()
 
 
 @router.message(Command("ticket"))
-@router.message(F.text == "📝 Create Support Ticket")
+@router.message(F.text.in_(variants("button_create_ticket")))
+@flags.throttle(limit=3, per=60)
+@flags.no_session
 async def start_ticket_creation(message: Message, state: FSMContext):
     """Start the support ticket creation process"""
+    locale = resolve_locale(message.from_user)
     await state.set_state(SupportTicketStates.waiting_for_subject)
     await message.answer(
-        "📝 <b>Create Support Ticket</b>\n\n"
-        "Please enter the subject of your ticket:",
+        get_text("ticket_subject_prompt", locale),
         parse_mode="HTML",
-        reply_markup=get_cancel_keyboard()
+        reply_markup=get_cancel_keyboard(locale)
     )
 
 
-@router.message(SupportTicketStates.waiting_for_subject, F.text == "❌ Cancel")
-@router.message(SupportTicketStates.waiting_for_description, F.text == "❌ Cancel")
-@router.message(SupportTicketStates.waiting_for_contact, F.text == "❌ Cancel")
+@router.message(SupportTicketStates.waiting_for_subject, F.text.in_(variants("button_cancel")))
+@router.message(SupportTicketStates.waiting_for_description, F.text.in_(variants("button_cancel")))
+@router.message(SupportTicketStates.waiting_for_contact, F.text.in_(variants("button_cancel")))
+@flags.no_session
 async def cancel_ticket_creation(message: Message, state: FSMContext):
     """Cancel ticket creation"""
+    locale = resolve_locale(message.from_user)
     await state.clear()
     await message.answer(
-        "❌ Ticket creation cancelled.",
-        reply_markup=get_main_menu_keyboard()
+        get_text("ticket_cancelled", locale),
+        reply_markup=get_main_menu_keyboard(locale)
     )
 
 
 @router.message(SupportTicketStates.waiting_for_subject)
+@flags.no_session
 async def process_subject(message: Message, state: FSMContext):
     """Process the ticket subject"""
     if not message.text:
         await message.answer("Please enter a valid subject.")
         return
+    if len(message.text) > SUBJECT_MAX_LENGTH:
+        await message.answer(f"Please keep the subject to {SUBJECT_MAX_LENGTH} characters or fewer.")
+        return
     
+    locale = resolve_locale(message.from_user)
     await state.update_data(subject=message.text)
     await state.set_state(SupportTicketStates.waiting_for_description)
     await message.answer(
-        "📄 Please provide a detailed description of your issue:",
-        reply_markup=get_cancel_keyboard()
+        get_text("ticket_description_prompt", locale),
+        reply_markup=get_cancel_keyboard(locale)
     )
 
 
 @router.message(SupportTicketStates.waiting_for_description)
-async def process_description(message: Message, state: FSMContext):
+@flags.no_session
+async def process_description(message: Message, state: FSMContext, duplicates: DuplicateDetector):
     """Process the ticket description"""
     if not message.text:
         await message.answer("Please enter a valid description.")
         return
     
-    await state.update_data(description=message.text)
+    data = await state.get_data()
+    duplicate_of = duplicates.find(data['subject'], message.text)
+    await state.update_data(description=message.text, duplicate_of=duplicate_of)
     await state.set_state(SupportTicketStates.waiting_for_contact)
+    locale = resolve_locale(message.from_user)
     await message.answer(
-        "📧 Please provide your contact information (email or phone):\n\n"
-        "You can also skip this step if you prefer.",
-        reply_markup=get_skip_keyboard()
+        get_text("ticket_contact_prompt", locale),
+        reply_markup=get_skip_keyboard(locale)
     )
 
 
-@router.message(SupportTicketStates.waiting_for_contact, F.text == "⏭ Skip")
-async def skip_contact_info(message: Message, state: FSMContext, session: AsyncSession):
-    """Skip contact information and save ticket"""
+async def save_ticket(
+    message: Message,
+    state: FSMContext,
+    session: AsyncSession,
+    tickets: TicketService,
+    relay: TicketRelay,
+    duplicates: DuplicateDetector,
+    contact_info: str | None
+):
+    """Create the ticket from the collected data and post it to the support chat"""
     data = await state.get_data()
     
-    # Create ticket in database
-    ticket = SupportTicket(
+    ticket = await tickets.create(
+        session,
         user_id=message.from_user.id,
         subject=data['subject'],
         description=data['description'],
-        contact_info=None
+        contact_info=contact_info,
+        duplicate_of=data.get('duplicate_of')
     )
-    session.add(ticket)
-    await session.commit()
+    duplicates.add(ticket.id, ticket.subject, ticket.description, ticket.duplicate_of)
     
     await state.clear()
-    await message.answer(
+    contact_line = f"📧 Contact: {escape(contact_info)}\n" if contact_info else ""
+    duplicate_line = (
+        "ℹ️ A similar issue has already been reported and is being looked into.\n"
+        if ticket.duplicate_of else ""
+    )
+    confirmation = await message.answer(
         "✅ <b>Support ticket created successfully!</b>\n\n"
         f"📌 Ticket ID: #{ticket.id}\n"
-        f"📝 Subject: {ticket.subject}\n\n"
-        "Our support team will review your ticket and get back to you soon.",
+        f"📝 Subject: {escape(ticket.subject)}\n"
+        f"{contact_line}\n"
+        f"{duplicate_line}"
+        "Our support team will review your ticket and get back to you soon.\n"
+        "Reply to this message to add details to your ticket.",
         parse_mode="HTML",
-        reply_markup=get_main_menu_keyboard()
+        reply_markup=get_main_menu_keyboard(resolve_locale(message.from_user))
     )
+    
+    try:
+        await relay.publish(
+            ticket,
+            format_ticket(ticket) + "\n\n↩️ Reply to this message to answer the user.",
+            confirmation,
+            reply_markup=get_ticket_actions_keyboard(ticket)
+        )
+    except TelegramAPIError:
+        logger.exception(f"Failed to post ticket #{ticket.id} to the support chat")
+
+
+@router.message(SupportTicketStates.waiting_for_contact, F.text.in_(variants("button_skip")))
+async def skip_contact_info(
+    message: Message,
+    state: FSMContext,
+    session: AsyncSession,
+    tickets: TicketService,
+    relay: TicketRelay,
+    duplicates: DuplicateDetector
+):
+    """Skip contact information and save ticket"""
+    await save_ticket(message, state, session, tickets, relay, duplicates, contact_info=None)
 
 
 @router.message(SupportTicketStates.waiting_for_contact)
-async def process_contact_info(message: Message, state: FSMContext, session: AsyncSession):
+async def process_contact_info(
+    message: Message,
+    state: FSMContext,
+    session: AsyncSession,
+    tickets: TicketService,
+    relay: TicketRelay,
+    duplicates: DuplicateDetector
+):
     """Process contact information and save ticket"""
     if not message.text:
         await message.answer("Please enter valid contact information or skip.")
         return
+    if len(message.text) > CONTACT_MAX_LENGTH:
+        await message.answer(f"Please keep the contact information to {CONTACT_MAX_LENGTH} characters or fewer.")
+        return
     
-    data = await state.get_data()
-    
-    # Create ticket in database
-    ticket = SupportTicket(
-        user_id=message.from_user.id,
-        subject=data['subject'],
-        description=data['description'],
-        contact_info=message.text
-    )
-    session.add(ticket)
-    await session.commit()
-    
-    await state.clear()
-    await message.answer(
-        "✅ <b>Support ticket created successfully!</b>\n\n"
-        f"📌 Ticket ID: #{ticket.id}\n"
-        f"📝 Subject: {ticket.subject}\n"
-        f"📧 Contact: {ticket.contact_info}\n\n"
-        "Our support team will review your ticket and get back to you soon.",
-        parse_mode="HTML",
-        reply_markup=get_main_menu_keyboard()
-    )
+    await save_ticket(message, state, session, tickets, relay, duplicates, contact_info=message.text)
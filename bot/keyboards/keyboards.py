@@ -1,33 +1,155 @@
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
-from aiogram.utils.keyboard import ReplyKeyboardBuilder
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    ReplyKeyboardMarkup,
+    KeyboardButton,
+    ReplyKeyboardRemove
+)
+from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
+from bot.templates import DEFAULT_LOCALE, TEXTS, freeze_markup, get_text
 
-def get_main_menu_keyboard() -> ReplyKeyboardMarkup:
+
+class TicketPage(CallbackData, prefix="tp"):
+    """Page of the admin ticket queue, continuing after `after_id`"""
+    status: str
+    after_id: int = 0
+
+
+class TicketView(CallbackData, prefix="tv"):
+    """Open a single ticket"""
+    ticket_id: int
+
+
+class TicketAction(CallbackData, prefix="ta"):
+    """Status transition on a ticket"""
+    action: str
+    ticket_id: int
+
+
+class SearchPage(CallbackData, prefix="sp"):
+    """Page of the current ticket search; the query itself is kept in FSM data"""
+    page: int
+
+
+def build_main_menu_keyboard(locale: str = DEFAULT_LOCALE) -> ReplyKeyboardMarkup:
     """Main menu keyboard"""
     builder = ReplyKeyboardBuilder()
     builder.row(
-        KeyboardButton(text="📝 Create Support Ticket"),
-        KeyboardButton(text="ℹ️ Help")
+        KeyboardButton(text=get_text("button_create_ticket", locale)),
+        KeyboardButton(text=get_text("button_help", locale))
     )
     return builder.as_markup(resize_keyboard=True)
 
 
-def get_cancel_keyboard() -> ReplyKeyboardMarkup:
+def build_cancel_keyboard(locale: str = DEFAULT_LOCALE) -> ReplyKeyboardMarkup:
     """Cancel keyboard"""
     builder = ReplyKeyboardBuilder()
-    builder.row(KeyboardButton(text="❌ Cancel"))
+    builder.row(KeyboardButton(text=get_text("button_cancel", locale)))
     return builder.as_markup(resize_keyboard=True)
 
 
-def get_skip_keyboard() -> ReplyKeyboardMarkup:
+def build_skip_keyboard(locale: str = DEFAULT_LOCALE) -> ReplyKeyboardMarkup:
     """Skip keyboard for optional fields"""
     builder = ReplyKeyboardBuilder()
     builder.row(
-        KeyboardButton(text="⏭ Skip"),
-        KeyboardButton(text="❌ Cancel")
+        KeyboardButton(text=get_text("button_skip", locale)),
+        KeyboardButton(text=get_text("button_cancel", locale))
     )
     return builder.as_markup(resize_keyboard=True)
 
 
+# Reply keyboards never change, so each one is built, frozen and serialized once per locale
+_MAIN_MENU = {locale: freeze_markup(build_main_menu_keyboard(locale)) for locale in TEXTS}
+_CANCEL = {locale: freeze_markup(build_cancel_keyboard(locale)) for locale in TEXTS}
+_SKIP = {locale: freeze_markup(build_skip_keyboard(locale)) for locale in TEXTS}
+
+
+def get_main_menu_keyboard(locale: str = DEFAULT_LOCALE) -> ReplyKeyboardMarkup:
+    """Shared main menu keyboard"""
+    return _MAIN_MENU.get(locale) or _MAIN_MENU[DEFAULT_LOCALE]
+
+
+def get_cancel_keyboard(locale: str = DEFAULT_LOCALE) -> ReplyKeyboardMarkup:
+    """Shared cancel keyboard"""
+    return _CANCEL.get(locale) or _CANCEL[DEFAULT_LOCALE]
+
+
+def get_skip_keyboard(locale: str = DEFAULT_LOCALE) -> ReplyKeyboardMarkup:
+    """Shared skip keyboard"""
+    return _SKIP.get(locale) or _SKIP[DEFAULT_LOCALE]
+
+
+def get_ticket_list_keyboard(tickets, status: str, has_more: bool) -> InlineKeyboardMarkup:
+    """Inline keyboard for a page of the ticket queue"""
+    builder = InlineKeyboardBuilder()
+    for ticket in tickets:
+        builder.row(InlineKeyboardButton(
+            text=f"#{ticket.id} {ticket.subject[:40]}",
+            callback_data=TicketView(ticket_id=ticket.id).pack()
+        ))
+    navigation = [
+        InlineKeyboardButton(
+            text=f"{'• ' if other == status else ''}{other}",
+            callback_data=TicketPage(status=other).pack()
+        )
+        for other in ("open", "in_progress", "resolved", "closed")
+    ]
+    builder.row(*navigation)
+    if has_more:
+        builder.row(InlineKeyboardButton(
+            text="Next ▶",
+            callback_data=TicketPage(status=status, after_id=tickets[-1].id).pack()
+        ))
+    return builder.as_markup()
+
+
+def get_search_results_keyboard(tickets, page: int, has_more: bool) -> InlineKeyboardMarkup:
+    """Inline keyboard for a page of ticket search results"""
+    builder = InlineKeyboardBuilder()
+    for ticket in tickets:
+        builder.row(InlineKeyboardButton(
+            text=f"#{ticket.id} {ticket.subject[:40]}",
+            callback_data=TicketView(ticket_id=ticket.id).pack()
+        ))
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton(
+            text="◀ Prev",
+            callback_data=SearchPage(page=page - 1).pack()
+        ))
+    if has_more:
+        navigation.append(InlineKeyboardButton(
+            text="Next ▶",
+            callback_data=SearchPage(page=page + 1).pack()
+        ))
+    if navigation:
+        builder.row(*navigation)
+    return builder.as_markup()
+
+
+def get_ticket_actions_keyboard(ticket) -> InlineKeyboardMarkup:
+    """Inline keyboard with the transitions available for a ticket"""
+    builder = InlineKeyboardBuilder()
+    actions = {
+        "open": [("🙋 Claim", "claim"), ("🚫 Close", "close")],
+        "in_progress": [("✅ Resolve", "resolve"), ("🚫 Close", "close")],
+        "resolved": [("🚫 Close", "close")],
+    }.get(ticket.status, [])
+    builder.row(*(
+        InlineKeyboardButton(
+            text=text,
+            callback_data=TicketAction(action=action, ticket_id=ticket.id).pack()
+        )
+        for text, action in actions
+    ))
+    builder.row(InlineKeyboardButton(
+        text="◀ Back to queue",
+        callback_data=TicketPage(status=ticket.status).pack()
+    ))
+    return builder.as_markup()
+
+
 # Remove keyboard
-remove_keyboard = ReplyKeyboardRemove()
+remove_keyboard = freeze_markup(ReplyKeyboardRemove())
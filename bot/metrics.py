@@ -0,0 +1,274 @@
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, Iterable
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject
+from aiohttp import web
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    """Monotonic counter; label values are passed as a tuple"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def set(self, labels: tuple = (), value: float = 0.0):
+        self._values[labels] = value
+
+
+class Histogram:
+    """Histogram with fixed buckets.
+
+    Observations are counted in their own bucket only; the cumulative
+    counts Prometheus expects are computed when rendering, which keeps
+    observe() to one bisect and a few dict updates.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, labels: tuple, value: float):
+        counts = self._values.get(labels)
+        if counts is None:
+            counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, counts in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                bucket_labels = _format_labels((*self.labelnames, "le"), (*labels, bound))
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {counts[-1]}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    """Collection of metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: list[Counter | Histogram] = []
+        self._collectors: list[Callable[[], None]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Run `collector` before every scrape, e.g. to refresh gauges"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+UPDATES = REGISTRY.register(Counter(
+    "bot_updates_total", "Updates received, by update type", ("type",)
+))
+HANDLER_DURATION = REGISTRY.register(Histogram(
+    "bot_handler_duration_seconds", "Time spent in handlers, by router and handler", ("router", "handler")
+))
+HANDLER_ERRORS = REGISTRY.register(Counter(
+    "bot_handler_errors_total", "Exceptions raised by handlers", ("router", "handler", "error")
+))
+DB_QUERY_DURATION = REGISTRY.register(Histogram(
+    "db_query_duration_seconds", "Database statement execution time", ("operation",)
+))
+DB_ERRORS = REGISTRY.register(Counter(
+    "db_errors_total", "Failed database statements", ("error",)
+))
+DB_POOL_WAIT = REGISTRY.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection"
+))
+DB_POOL_CONNECTIONS = REGISTRY.register(Gauge(
+    "db_pool_connections", "Connection pool usage", ("state",)
+))
+API_DURATION = REGISTRY.register(Histogram(
+    "telegram_api_duration_seconds", "Bot API request latency", ("method",)
+))
+API_ERRORS = REGISTRY.register(Counter(
+    "telegram_api_errors_total", "Failed Bot API requests", ("method", "error")
+))
+BROADCAST_MESSAGES = REGISTRY.register(Counter(
+    "broadcast_messages_total", "Broadcast deliveries, by outcome", ("status",)
+))
+TICKETS_ARCHIVED = REGISTRY.register(Counter(
+    "tickets_archived_total", "Closed tickets moved from the database to archive files"
+))
+SLA_ACTIONS = REGISTRY.register(Counter(
+    "sla_actions_total", "Ticket deadlines handled, by action (expired: the ticket had moved on)", ("action",)
+))
+
+SQL_OPERATIONS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE"})
+
+
+class UpdateCounterMiddleware(BaseMiddleware):
+    """Outer update middleware counting every incoming update"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        UPDATES.inc((getattr(event, "event_type", "unknown"),))
+        return await handler(event, data)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware timing handlers, labelled by the router module they live in"""
+
+    def __init__(self):
+        super().__init__()
+        self._labels: dict[Callable, tuple[str, str]] = {}
+
+    def _handler_labels(self, data: Dict[str, Any]) -> tuple[str, str]:
+        handler_object = data.get("handler")
+        if handler_object is None:
+            return ("unknown", "unknown")
+        callback = handler_object.callback
+        labels = self._labels.get(callback)
+        if labels is None:
+            labels = self._labels[callback] = (callback.__module__.rsplit(".", 1)[-1], callback.__name__)
+        return labels
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        labels = self._handler_labels(data)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.inc((*labels, type(e).__name__))
+            raise
+        finally:
+            HANDLER_DURATION.observe(labels, time.perf_counter() - start)
+
+
+class RequestMetricsMiddleware(BaseRequestMiddleware):
+    """Bot session middleware timing outgoing Bot API calls"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot,
+        method: TelegramMethod[TelegramType]
+    ) -> Response[TelegramType]:
+        name = method.__api_method__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS.inc((name, type(e).__name__))
+            raise
+        finally:
+            API_DURATION.observe((name,), time.perf_counter() - start)
+
+
+def instrument_database(db) -> None:
+    """Time statements on `db.engine` and export its pool usage"""
+    engine = db.engine.sync_engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip()[:6].upper()
+        DB_QUERY_DURATION.observe(
+            (operation if operation in SQL_OPERATIONS else "OTHER",),
+            time.perf_counter() - context._metrics_start
+        )
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        DB_ERRORS.inc((type(context.original_exception).__name__,))
+
+    if hasattr(db.engine.pool, "on_wait"):
+        db.engine.pool.on_wait = lambda seconds: DB_POOL_WAIT.observe((), seconds)
+
+    def collect_pool():
+        for state, value in db.pool_status().items():
+            DB_POOL_CONNECTIONS.set((state,), value)
+
+    REGISTRY.add_collector(collect_pool)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """Serve all metrics in the Prometheus text format"""
+    return web.Response(body=REGISTRY.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Serve /metrics on its own host and port, apart from the webhook server"""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
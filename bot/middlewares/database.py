@@ -1,10 +1,39 @@
 from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
 from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+
+class LazySession:
+    """Proxy for AsyncSession that only opens the session when first used"""
+    
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession]):
+        self._session_maker = session_maker
+        self._session: AsyncSession | None = None
+    
+    @property
+    def session(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._session_maker()
+        return self._session
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.session, name)
+    
+    async def close(self):
+        """Close the underlying session if it was ever opened"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
 
 
 class DatabaseMiddleware(BaseMiddleware):
-    """Middleware to inject database session into handlers"""
+    """Middleware to inject a lazily opened database session into handlers.
+    
+    Handlers marked with the `no_session` flag (`@flags.no_session`) get no
+    session at all.
+    """
     
     def __init__(self, session_maker):
         super().__init__()
@@ -16,9 +45,15 @@ class DatabaseMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        async with self.session_maker() as session:
-            data['session'] = session
+        if get_flag(data, "no_session"):
+            return await handler(event, data)
+        
+        session = LazySession(self.session_maker)
+        data['session'] = session
+        try:
             return await handler(event, data)
+        finally:
+            await session.close()
 
 
 class AdminMiddleware(BaseMiddleware):
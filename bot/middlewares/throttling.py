@@ -0,0 +1,101 @@
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Message, TelegramObject
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Middleware to limit how fast a single user can trigger handlers
+
+    Each (user, handler) pair gets a sliding window of its last `limit`
+    timestamps. Handlers can override the default limit with
+    `@flags.throttle(limit=3, per=60)`. Excess updates are dropped before
+    they reach the database middleware, and users who keep hitting the
+    limit are put on a cooldown during which all their updates are ignored.
+    """
+
+    def __init__(
+        self,
+        limit: int = 10,
+        per: float = 10.0,
+        cooldown: float = 60.0,
+        strikes: int = 5,
+        max_entries: int = 50_000
+    ):
+        super().__init__()
+        self.limit = limit
+        self.per = per
+        self.cooldown = cooldown
+        self.strikes = strikes
+        self.max_entries = max_entries
+        # (user_id, handler) -> timestamps of recent accepted updates
+        self._windows: OrderedDict[tuple[int, str], deque[float]] = OrderedDict()
+        # user_id -> (recent strikes, time of the last strike, cooldown end)
+        self._offenders: OrderedDict[int, tuple[int, float, float]] = OrderedDict()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        offender = self._offenders.get(user.id)
+        if offender is not None and offender[2] > now:
+            return None
+
+        throttle = get_flag(data, "throttle")
+        limit = getattr(throttle, "limit", None) or self.limit
+        per = getattr(throttle, "per", None) or self.per
+        handler_object = data.get("handler")
+        handler_key = handler_object.callback.__name__ if handler_object else "default"
+
+        window = self._window(user.id, handler_key, limit)
+        if len(window) == limit and now - window[0] < per:
+            await self._on_throttled(event, user.id, offender, now)
+            return None
+
+        window.append(now)
+        return await handler(event, data)
+
+    def _window(self, user_id: int, handler_key: str, limit: int) -> deque[float]:
+        key = (user_id, handler_key)
+        window = self._windows.get(key)
+        if window is None or window.maxlen != limit:
+            window = deque(window or (), maxlen=limit)
+            self._windows[key] = window
+        self._windows.move_to_end(key)
+        while len(self._windows) > self.max_entries:
+            self._windows.popitem(last=False)
+        return window
+
+    async def _on_throttled(
+        self,
+        event: TelegramObject,
+        user_id: int,
+        offender: tuple[int, float, float] | None,
+        now: float
+    ):
+        strikes = 0
+        if offender is not None and now - offender[1] < self.cooldown:
+            strikes = offender[0]
+        strikes += 1
+        blocked_until = now + self.cooldown if strikes >= self.strikes else 0.0
+        self._offenders[user_id] = (0 if blocked_until else strikes, now, blocked_until)
+        self._offenders.move_to_end(user_id)
+        while len(self._offenders) > self.max_entries:
+            self._offenders.popitem(last=False)
+
+        # Only answer once per episode so the warning itself can't be used to flood
+        if not isinstance(event, Message):
+            return
+        if blocked_until:
+            await event.answer(f"⛔ Too many requests. Please wait {int(self.cooldown)} seconds.")
+        elif strikes == 1:
+            await event.answer("⏳ You're sending messages too fast. Please slow down.")
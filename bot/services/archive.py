@@ -0,0 +1,197 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.metrics import TICKETS_ARCHIVED
+from database.models import SupportTicket, TicketMessage
+
+logger = logging.getLogger(__name__)
+
+MONTHS_AHEAD = 3
+# pg_advisory_xact_lock key, so only one process at a time maintains partitions
+PARTITION_LOCK_ID = 0x5EED_0023
+_PARTITION_NAME = re.compile(r"^support_tickets_p(\d{4})(\d{2})$")
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def ticket_row(row) -> dict:
+    """JSON-friendly copy of a support_tickets row"""
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in row.items()
+    }
+
+
+def write_chunk(path: Path, rows: list[dict]):
+    """Append rows as one gzip member of JSON lines and make sure they hit the disk"""
+    payload = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+    with open(path, "ab") as file:
+        file.write(gzip.compress(payload.encode("utf-8")))
+        file.flush()
+        os.fsync(file.fileno())
+
+
+class TicketArchiver:
+    """Moves old closed tickets out of `support_tickets` into gzipped JSON Lines files.
+
+    Every `interval` seconds, closed tickets created more than `after_days`
+    days ago are archived `chunk_size` at a time. Each chunk is read with
+    FOR UPDATE SKIP LOCKED, written and fsynced to the run's
+    `support_tickets-<timestamp>-<pid>.jsonl.gz` file, then deleted in the
+    same short transaction. The live table is only ever locked a chunk at a
+    time, and on PostgreSQL several processes can archive side by side.
+    A crash between the write and the commit leaves the chunk in the table,
+    to be archived (again) on the next run.
+
+    On PostgreSQL, where the table is partitioned by month (migration
+    0008), each run also creates the partitions for the coming months and
+    drops partitions that archival has emptied.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        directory: str | Path = "archive",
+        after_days: int = 0,
+        chunk_size: int = 1000,
+        interval: float = 3600
+    ):
+        self.session_maker = session_maker
+        self.directory = Path(directory)
+        self.after_days = after_days
+        self.chunk_size = chunk_size
+        self.interval = interval
+        self.partitioned = False
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        """Detect partitioning and start the background loop"""
+        async with self.session_maker() as session:
+            if session.bind.dialect.name == "postgresql":
+                relkind = await session.scalar(
+                    text("SELECT relkind FROM pg_class WHERE oid = to_regclass('support_tickets')")
+                )
+                self.partitioned = relkind == "p"
+        if self.partitioned or self.after_days > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self):
+        while True:
+            try:
+                if self.after_days > 0:
+                    await self.archive()
+                if self.partitioned:
+                    await self.maintain_partitions()
+            except Exception:
+                logger.exception("Ticket archival failed")
+            await asyncio.sleep(self.interval)
+
+    async def archive(self) -> int:
+        """Archive every eligible ticket, chunk by chunk; returns how many were moved"""
+        cutoff = datetime.utcnow() - timedelta(days=self.after_days)
+        path = self.directory / f"support_tickets-{datetime.utcnow():%Y%m%d-%H%M%S}-{os.getpid()}.jsonl.gz"
+        total = 0
+        while True:
+            moved = await self._archive_chunk(path, cutoff)
+            total += moved
+            if moved < self.chunk_size:
+                break
+        if total:
+            logger.info(f"Archived {total} closed ticket(s) to {path}")
+        return total
+
+    async def _archive_chunk(self, path: Path, cutoff: datetime) -> int:
+        table = SupportTicket.__table__
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(table)
+                .where(table.c.status == "closed", table.c.created_at < cutoff)
+                .order_by(table.c.created_at, table.c.id)
+                .limit(self.chunk_size)
+                .with_for_update(skip_locked=True)
+            )
+            rows = [ticket_row(row) for row in result.mappings()]
+            if not rows:
+                return 0
+            self.directory.mkdir(parents=True, exist_ok=True)
+            await asyncio.to_thread(write_chunk, path, rows)
+
+            ids = [row["id"] for row in rows]
+            await session.execute(delete(TicketMessage).where(TicketMessage.ticket_id.in_(ids)))
+            # The created_at bound lets PostgreSQL skip the partitions that can't match
+            await session.execute(
+                delete(SupportTicket)
+                .where(SupportTicket.id.in_(ids), SupportTicket.created_at < cutoff)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        TICKETS_ARCHIVED.inc(amount=len(rows))
+        return len(rows)
+
+    async def maintain_partitions(self):
+        """Create the next months' partitions and drop old ones that are empty"""
+        this_month = datetime.utcnow().date().replace(day=1)
+        cutoff = (datetime.utcnow() - timedelta(days=self.after_days)).date()
+        async with self.session_maker() as session:
+            await session.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": PARTITION_LOCK_ID})
+            # Both statements need a brief exclusive lock on support_tickets; rather
+            # than queue live queries behind a long one, give up and retry next run
+            await session.execute(text("SET LOCAL lock_timeout = '2s'"))
+            existing = set((await session.execute(text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent = 'support_tickets'::regclass"
+            ))).scalars())
+
+            for months in range(MONTHS_AHEAD + 1):
+                month = add_months(this_month, months)
+                name = f"support_tickets_p{month:%Y%m}"
+                if name not in existing:
+                    await self._ddl(
+                        session,
+                        f"CREATE TABLE {name} PARTITION OF support_tickets "
+                        f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')",
+                        f"create ticket partition {name}"
+                    )
+
+            if self.after_days > 0:
+                for name in sorted(existing):
+                    match = _PARTITION_NAME.match(name)
+                    # Only months entirely before the cutoff, with no open tickets left either
+                    if match is None or add_months(date(int(match[1]), int(match[2]), 1), 1) > cutoff:
+                        continue
+                    if await session.scalar(text(f"SELECT EXISTS (SELECT 1 FROM {name})")):
+                        continue
+                    await self._ddl(session, f"DROP TABLE {name}", f"drop empty ticket partition {name}")
+            await session.commit()
+
+    @staticmethod
+    async def _ddl(session: AsyncSession, statement: str, description: str):
+        try:
+            async with session.begin_nested():
+                await session.execute(text(statement))
+        except DBAPIError as e:
+            # E.g. the DEFAULT partition already holds rows for a new month
+            logger.warning(f"Could not {description}: {e}")
+        else:
+            logger.info(description[0].upper() + description[1:])
+
+    async def close(self):
+        """Stop the background loop"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
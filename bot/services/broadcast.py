@@ -0,0 +1,779 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter
+)
+from aiogram.enums import ContentType
+from aiogram.methods import CopyMessage, CopyMessages, SendMessage, SendPhoto, SendVideo, TelegramMethod
+from aiogram.types import Message
+from sqlalchemy import BigInteger, any_, bindparam, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.metrics import BROADCAST_MESSAGES
+from bot.services.users import forget_users
+from database.models import BroadcastDelivery, BroadcastJob, User
+from database.upsert import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows roughly one message per second to the same chat
+PER_CHAT_INTERVAL = 1.0
+RECIPIENT_BATCH_SIZE = 1000
+# Deliveries are checkpointed to the database in chunks of this size
+CHECKPOINT_SIZE = 200
+# A job's claim expires this long after it was last renewed, so another process can take it over
+LEASE_DURATION = 60.0
+# Leases are renewed this many times per LEASE_DURATION, so a slow renewal or two doesn't lose them
+LEASE_RENEWALS = 4
+# Delivery failures after which the user is marked inactive
+UNREACHABLE_STATUSES = frozenset({"blocked", "deactivated", "chat_not_found"})
+BROADCAST_HEADER = "📢 <b>Broadcast Message</b>\n\n"
+# Length of the header as the user sees it, which is what Telegram's limits count
+HEADER_LENGTH = len("📢 Broadcast Message\n\n")
+MAX_TEXT_LENGTH = 4096
+MAX_CAPTION_LENGTH = 1024
+CAPTIONED_CONTENT_TYPES = frozenset({
+    ContentType.PHOTO,
+    ContentType.VIDEO,
+    ContentType.ANIMATION,
+    ContentType.DOCUMENT,
+    ContentType.AUDIO,
+    ContentType.VOICE,
+})
+
+
+class TokenBucket:
+    """Token bucket rate limiter shared by all broadcast workers"""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, delay: float):
+        """Hand out no tokens for `delay` seconds, then start again from an empty bucket"""
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        self._tokens = 0
+        self._updated = self._paused_until
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChatRateLimiter:
+    """Keeps sends to the same chat at least `interval` seconds apart"""
+
+    def __init__(self, interval: float = PER_CHAT_INTERVAL, max_chats: int = 10_000):
+        self.interval = interval
+        self.max_chats = max_chats
+        self._next_allowed: dict[int, float] = {}
+
+    async def acquire(self, chat_id: int):
+        """Wait for the chat's slot and reserve the next one"""
+        now = time.monotonic()
+        if len(self._next_allowed) > self.max_chats:
+            self._next_allowed = {
+                chat: ts for chat, ts in self._next_allowed.items() if ts > now
+            }
+        ready_at = max(now, self._next_allowed.get(chat_id, 0.0))
+        self._next_allowed[chat_id] = ready_at + self.interval
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+
+
+async def iter_active_user_ids(
+    session_maker: async_sessionmaker[AsyncSession],
+    batch_size: int = RECIPIENT_BATCH_SIZE,
+    after_id: int | None = None
+) -> AsyncIterator[list[int]]:
+    """Yield active user telegram IDs in ascending batches using keyset pagination.
+
+    Each batch is fetched in its own short-lived session, so no transaction
+    or ORM identity map is held open while messages are being sent.
+    """
+    while True:
+        query = (
+            select(User.telegram_id)
+            .where(User.is_active == True)
+            .order_by(User.telegram_id)
+            .limit(batch_size)
+        )
+        if after_id is not None:
+            query = query.where(User.telegram_id > after_id)
+        async with session_maker() as session:
+            result = await session.execute(query)
+            batch = list(result.scalars())
+        if not batch:
+            return
+        yield batch
+        if len(batch) < batch_size:
+            return
+        after_id = batch[-1]
+
+
+def build_payload(message: Message) -> dict:
+    """Describe the admin's message so it can be re-sent to every user.
+
+    Text is sent as a new message, anything else is copied from the admin's
+    chat. The broadcast header goes in front of the text or caption, unless
+    it would push it over Telegram's length limit.
+    """
+    if message.text:
+        text = message.html_text
+        if len(message.text) + HEADER_LENGTH <= MAX_TEXT_LENGTH:
+            text = BROADCAST_HEADER + text
+        return {"kind": "message", "text": text}
+    caption = None
+    if message.content_type in CAPTIONED_CONTENT_TYPES:
+        if not message.caption:
+            caption = BROADCAST_HEADER
+        elif len(message.caption) + HEADER_LENGTH <= MAX_CAPTION_LENGTH:
+            caption = BROADCAST_HEADER + message.html_text
+    return {
+        "kind": "copy",
+        "from_chat_id": message.chat.id,
+        "message_id": message.message_id,
+        # None copies the original caption (or lack of one) unchanged
+        "caption": caption,
+    }
+
+
+def build_album_payload(messages: list[Message]) -> dict:
+    """Describe a media group; it is copied as is, captions included"""
+    return {
+        "kind": "album",
+        "from_chat_id": messages[0].chat.id,
+        "message_ids": sorted(message.message_id for message in messages),
+    }
+
+
+@dataclass(frozen=True, slots=True)
+class SendSpec:
+    """A compiled broadcast message: the method to call, complete except for `chat_id`"""
+    template: TelegramMethod
+
+    def for_chat(self, chat_id: int) -> TelegramMethod:
+        # model_copy skips validation, which dominates the cost of building the method anew
+        return self.template.model_copy(update={"chat_id": chat_id})
+
+
+def compile_payload(payload: dict) -> SendSpec:
+    """Turn a stored payload into a SendSpec, once per job"""
+    kind = payload["kind"]
+    if kind == "message":
+        template = SendMessage(chat_id=0, text=payload["text"], parse_mode="HTML")
+    elif kind == "copy":
+        template = CopyMessage(
+            chat_id=0,
+            from_chat_id=payload["from_chat_id"],
+            message_id=payload["message_id"],
+            caption=payload["caption"],
+            parse_mode="HTML" if payload["caption"] is not None else None
+        )
+    elif kind == "album":
+        template = CopyMessages(
+            chat_id=0,
+            from_chat_id=payload["from_chat_id"],
+            message_ids=payload["message_ids"]
+        )
+    # Payloads of jobs queued by earlier versions, without the header applied
+    elif kind == "text":
+        template = SendMessage(chat_id=0, text=BROADCAST_HEADER + payload["text"], parse_mode="HTML")
+    elif kind == "photo":
+        template = SendPhoto(
+            chat_id=0,
+            photo=payload["file_id"],
+            caption=BROADCAST_HEADER + (payload["caption"] or ""),
+            parse_mode="HTML"
+        )
+    elif kind == "video":
+        template = SendVideo(
+            chat_id=0,
+            video=payload["file_id"],
+            caption=BROADCAST_HEADER + (payload["caption"] or ""),
+            parse_mode="HTML"
+        )
+    else:
+        raise ValueError(f"Unknown broadcast payload kind: {kind}")
+    return SendSpec(template)
+
+
+def source_message_gone(error: Exception) -> bool:
+    """The admin deleted the message being copied; every further send would fail too"""
+    return isinstance(error, TelegramBadRequest) and "message to copy not found" in error.message.lower()
+
+
+def classify_error(error: Exception) -> str:
+    """Map a send error to the delivery status recorded for the recipient"""
+    if isinstance(error, TelegramForbiddenError):
+        # Bot was blocked, or the account was deleted
+        if "deactivated" in error.message.lower():
+            return "deactivated"
+        return "blocked"
+    if isinstance(error, TelegramBadRequest) and "chat not found" in error.message.lower():
+        return "chat_not_found"
+    return "failed"
+
+
+def deactivate_users_statement(telegram_ids: list[int], dialect_name: str):
+    """Bulk UPDATE marking the given users inactive.
+
+    On PostgreSQL the IDs are bound as a single array parameter
+    (`telegram_id = ANY(:ids)`), so the statement text is the same for every
+    flush and stays in the prepared-statement cache.
+    """
+    if dialect_name == "postgresql":
+        condition = User.telegram_id == any_(
+            bindparam("ids", telegram_ids, type_=ARRAY(BigInteger))
+        )
+    else:
+        condition = User.telegram_id.in_(telegram_ids)
+    return update(User).where(condition).values(is_active=False, deactivated_at=datetime.utcnow())
+
+
+@dataclass
+class _Batch:
+    """A page of recipients; the checkpoint moves past it once it is fully processed"""
+    last_id: int
+    remaining: int
+
+
+@dataclass
+class RunningBroadcast:
+    """In-memory state of a broadcast job that is being delivered"""
+    job_id: int
+    spec: SendSpec
+    admin_chat_id: int
+    status_message_id: int | None
+    total: int
+    sent: int = 0
+    failed: int = 0
+    checkpoint: int | None = None
+    stop_reason: str | None = None
+    deactivated: int = 0
+    pending: list[dict] = field(default_factory=list)
+    unreachable: list[int] = field(default_factory=list)
+    batches: deque[_Batch] = field(default_factory=deque)
+    flush_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Sends waiting out a flood-control delay before going back into the queue
+    retries: set[asyncio.Task] = field(default_factory=set)
+    started_at: float = field(default_factory=time.monotonic)
+    processed_at_start: int = 0
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.failed
+
+    def stop(self, reason: str):
+        """Stop delivering; recipients still waiting for a retry are left for the resume"""
+        self.stop_reason = reason
+        for task in self.retries:
+            task.cancel()
+
+    def record(self, chat_id: int, batch: _Batch, status: str):
+        """Register a delivery outcome and advance the checkpoint"""
+        BROADCAST_MESSAGES.inc((status,))
+        if status == "sent":
+            self.sent += 1
+        else:
+            self.failed += 1
+        if status in UNREACHABLE_STATUSES:
+            self.unreachable.append(chat_id)
+        self.pending.append({"job_id": self.job_id, "telegram_id": chat_id, "status": status})
+        batch.remaining -= 1
+        self.advance_checkpoint()
+
+    def advance_checkpoint(self):
+        """Move the checkpoint past every leading batch that is fully processed"""
+        while self.batches and self.batches[0].remaining == 0:
+            self.checkpoint = self.batches.popleft().last_id
+
+    @classmethod
+    def from_model(cls, job: BroadcastJob) -> "RunningBroadcast":
+        return cls(
+            job_id=job.id,
+            spec=compile_payload(job.payload),
+            admin_chat_id=job.admin_chat_id,
+            status_message_id=job.status_message_id,
+            total=job.total,
+            sent=job.sent,
+            failed=job.failed,
+            checkpoint=job.last_telegram_id,
+            # Paused or cancelled from another process while its owner was down
+            stop_reason=job.stop_requested,
+            processed_at_start=job.sent + job.failed
+        )
+
+
+class Broadcaster:
+    """Delivers persisted broadcast jobs in the background with a bounded pool of rate-limited senders.
+
+    A process only delivers a job while it holds the job's lease: `owner`
+    is set to its `owner_id` and `lease_until` is renewed at every
+    checkpoint, and on a timer of its own several times per
+    `lease_duration`, however slow deliveries or status updates are. Jobs
+    are claimed with a conditional UPDATE, so with several replicas (or an
+    old and a new process overlapping during a restart) each job is
+    delivered by exactly one of them. Jobs whose lease has expired, because
+    their process died, are taken over within `lease_duration` seconds.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        session_maker: async_sessionmaker[AsyncSession],
+        rate_limit: float = 30,
+        workers: int = 20,
+        progress_interval: float = 5.0,
+        lease_duration: float = LEASE_DURATION
+    ):
+        self.bot = bot
+        self.session_maker = session_maker
+        self.workers = workers
+        self.progress_interval = progress_interval
+        self.lease_duration = lease_duration
+        self.bucket = TokenBucket(rate_limit)
+        self.chat_limiter = ChatRateLimiter()
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._running: dict[int, RunningBroadcast] = {}
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._watcher: asyncio.Task | None = None
+
+    async def create(self, payload: dict, admin_chat_id: int, status_message_id: int, total: int) -> int:
+        """Persist a new broadcast job and start delivering it"""
+        async with self.session_maker() as session:
+            job = BroadcastJob(
+                admin_chat_id=admin_chat_id,
+                status_message_id=status_message_id,
+                payload=payload,
+                status="running",
+                total=total,
+                owner=self.owner_id,
+                lease_until=datetime.utcnow() + timedelta(seconds=self.lease_duration)
+            )
+            session.add(job)
+            await session.commit()
+        self._start(RunningBroadcast.from_model(job))
+        return job.id
+
+    async def resume_unfinished(self, owns: Callable[[int], bool] | None = None) -> int:
+        """Claim and restart unfinished jobs from their last checkpoint.
+
+        Only jobs nobody holds a live lease on are claimed. A background
+        check then keeps taking over jobs whose lease expires. In worker mode
+        `owns(admin_chat_id)` selects the jobs this process is responsible for.
+        """
+        resumed = await self._claim_unfinished(owns)
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch_leases(owns))
+        return resumed
+
+    async def _claim_unfinished(self, owns: Callable[[int], bool] | None) -> int:
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(BroadcastJob.id, BroadcastJob.admin_chat_id).where(
+                    BroadcastJob.status.in_(("queued", "running")),
+                    or_(BroadcastJob.lease_until.is_(None), BroadcastJob.lease_until < datetime.utcnow())
+                )
+            )
+            candidates = [job_id for job_id, chat_id in result.all() if owns is None or owns(chat_id)]
+        resumed = 0
+        for job_id in candidates:
+            job = await self._claim(job_id, ("queued", "running"))
+            if job is None:
+                # Another process got there first
+                continue
+            logger.info(f"Resuming broadcast #{job.id} after telegram_id {job.last_telegram_id}")
+            self._start(RunningBroadcast.from_model(job))
+            resumed += 1
+        return resumed
+
+    async def _watch_leases(self, owns: Callable[[int], bool] | None):
+        while True:
+            await asyncio.sleep(self.lease_duration)
+            try:
+                resumed = await self._claim_unfinished(owns)
+                if resumed:
+                    logger.info(f"Took over {resumed} broadcast(s) with an expired lease")
+            except Exception:
+                logger.exception("Failed to check broadcast leases")
+
+    async def _claim(self, job_id: int, from_statuses: tuple[str, ...]) -> BroadcastJob | None:
+        """Atomically take the lease on a job nobody else holds; returns the job, or None"""
+        now = datetime.utcnow()
+        async with self.session_maker() as session:
+            result = await session.execute(
+                update(BroadcastJob)
+                .where(
+                    BroadcastJob.id == job_id,
+                    BroadcastJob.status.in_(from_statuses),
+                    or_(BroadcastJob.lease_until.is_(None), BroadcastJob.lease_until < now)
+                )
+                .values(
+                    status="running",
+                    owner=self.owner_id,
+                    lease_until=now + timedelta(seconds=self.lease_duration),
+                    updated_at=now
+                )
+                .returning(BroadcastJob)
+                .execution_options(synchronize_session=False)
+            )
+            job = result.scalar_one_or_none()
+            await session.commit()
+            return job
+
+    async def pause(self, job_id: int) -> bool:
+        """Pause a job; it can be resumed later from its checkpoint"""
+        if job_id in self._running:
+            self._running[job_id].stop("paused")
+            return True
+        return (
+            await self._transition(job_id, ("queued",), "paused")
+            or await self._request_stop(job_id, "paused")
+        )
+
+    async def resume(self, job_id: int) -> bool:
+        """Resume a paused job"""
+        if job_id in self._running:
+            return False
+        job = await self._claim(job_id, ("paused",))
+        if job is None:
+            return False
+        self._start(RunningBroadcast.from_model(job))
+        return True
+
+    async def cancel(self, job_id: int) -> bool:
+        """Cancel a job for good"""
+        if job_id in self._running:
+            self._running[job_id].stop("cancelled")
+            return True
+        return (
+            await self._transition(job_id, ("queued", "paused"), "cancelled")
+            or await self._request_stop(job_id, "cancelled")
+        )
+
+    async def _request_stop(self, job_id: int, reason: str) -> bool:
+        """Ask the process delivering a job to stop it; it does so at its next checkpoint"""
+        async with self.session_maker() as session:
+            result = await session.execute(
+                update(BroadcastJob)
+                .where(BroadcastJob.id == job_id, BroadcastJob.status == "running")
+                .values(stop_requested=reason)
+            )
+            await session.commit()
+            return result.rowcount > 0
+
+    async def list_jobs(self, limit: int = 10) -> list[BroadcastJob]:
+        """Return the most recent jobs"""
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(BroadcastJob).order_by(BroadcastJob.id.desc()).limit(limit)
+            )
+            return list(result.scalars())
+
+    async def shutdown(self, timeout: float = 10.0):
+        """Stop running jobs, checkpointing them and releasing their lease so they resume elsewhere"""
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+        for job in self._running.values():
+            job.stop("shutdown")
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        _, still_running = await asyncio.wait(tasks, timeout=timeout)
+        for task in still_running:
+            task.cancel()
+        await asyncio.gather(*still_running, return_exceptions=True)
+
+    def _start(self, job: RunningBroadcast):
+        self._running[job.job_id] = job
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job.job_id] = task
+
+        def cleanup(_):
+            self._tasks.pop(job.job_id, None)
+            self._running.pop(job.job_id, None)
+
+        task.add_done_callback(cleanup)
+
+    async def _transition(
+        self,
+        job_id: int,
+        from_statuses: tuple[str, ...],
+        to_status: str,
+        owned: bool = False
+    ) -> bool:
+        """Conditionally change a job's status and release its lease.
+
+        With `owned`, only while this process still holds the lease.
+        """
+        query = update(BroadcastJob).where(BroadcastJob.id == job_id, BroadcastJob.status.in_(from_statuses))
+        if owned:
+            query = query.where(BroadcastJob.owner == self.owner_id)
+        async with self.session_maker() as session:
+            result = await session.execute(
+                query.values(
+                    status=to_status,
+                    owner=None,
+                    lease_until=None,
+                    stop_requested=None,
+                    updated_at=datetime.utcnow()
+                )
+            )
+            await session.commit()
+            return result.rowcount > 0
+
+    async def _run(self, job: RunningBroadcast):
+        queue: asyncio.Queue[tuple[int, _Batch]] = asyncio.Queue(maxsize=self.workers * 2)
+        workers = [
+            asyncio.create_task(self._worker(job, queue))
+            for _ in range(self.workers)
+        ]
+        reporter = asyncio.create_task(self._report_progress(job))
+        renewer = asyncio.create_task(self._keep_lease(job))
+        try:
+            # The bounded queue applies backpressure, so only a few batches
+            # of IDs are ever held in memory
+            async for ids in iter_active_user_ids(self.session_maker, after_id=job.checkpoint):
+                if job.stop_reason:
+                    break
+                batch = _Batch(last_id=ids[-1], remaining=0)
+                ids = await self._skip_delivered(job.job_id, ids)
+                batch.remaining = len(ids)
+                job.batches.append(batch)
+                job.advance_checkpoint()
+                for chat_id in ids:
+                    if job.stop_reason:
+                        break
+                    await queue.put((chat_id, batch))
+            await queue.join()
+        except Exception:
+            logger.exception(f"Broadcast #{job.job_id} crashed, pausing it")
+            job.stop(job.stop_reason or "paused")
+        finally:
+            for task in (*workers, *job.retries):
+                task.cancel()
+            reporter.cancel()
+            renewer.cancel()
+            await asyncio.gather(*workers, *job.retries, renewer, return_exceptions=True)
+            await self._flush(job)
+
+        if job.stop_reason == "lost":
+            return
+        if job.stop_reason == "shutdown":
+            # Still running; the next process to start claims it right away
+            await self._release(job)
+            return
+
+        status = job.stop_reason or "completed"
+        if await self._transition(job.job_id, ("queued", "running"), status, owned=True):
+            await self._report_final(job, status)
+
+    async def _worker(self, job: RunningBroadcast, queue: asyncio.Queue):
+        while True:
+            chat_id, batch = await queue.get()
+            if job.stop_reason:
+                # Left unrecorded so it is picked up again on resume
+                queue.task_done()
+                continue
+            try:
+                await self.chat_limiter.acquire(chat_id)
+                await self.bucket.acquire()
+                await self.bot(job.spec.for_chat(chat_id))
+                job.record(chat_id, batch, "sent")
+            except TelegramRetryAfter as e:
+                # Flood control applies to the whole bot: stop every worker for that long.
+                # Not a delivery failure, so the chat is retried however often it takes
+                self.bucket.pause(e.retry_after)
+                # Retry this chat later without holding up the worker; the item
+                # stays unfinished until then, so queue.join() waits for it
+                task = asyncio.create_task(self._retry_later(queue, (chat_id, batch), e.retry_after))
+                job.retries.add(task)
+                task.add_done_callback(job.retries.discard)
+                continue
+            except Exception as e:
+                if source_message_gone(e):
+                    logger.warning(f"Broadcast #{job.job_id}: the source message was deleted, pausing it")
+                    job.stop(job.stop_reason or "paused")
+                    queue.task_done()
+                    continue
+                job.record(chat_id, batch, classify_error(e))
+            if len(job.pending) >= CHECKPOINT_SIZE:
+                await self._flush(job)
+            queue.task_done()
+
+    @staticmethod
+    async def _retry_later(queue: asyncio.Queue, item: tuple[int, _Batch], delay: float):
+        try:
+            await asyncio.sleep(delay)
+            await queue.put(item)
+        finally:
+            # Also when cancelled, so queue.join() doesn't wait for a retry that never comes
+            queue.task_done()
+
+    async def _release(self, job: RunningBroadcast):
+        async with self.session_maker() as session:
+            await session.execute(
+                update(BroadcastJob)
+                .where(BroadcastJob.id == job.job_id, BroadcastJob.owner == self.owner_id)
+                .values(owner=None, lease_until=None)
+            )
+            await session.commit()
+
+    async def _skip_delivered(self, job_id: int, ids: list[int]) -> list[int]:
+        """Drop recipients already recorded for this job, e.g. after a restart mid-batch"""
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(BroadcastDelivery.telegram_id).where(
+                    BroadcastDelivery.job_id == job_id,
+                    BroadcastDelivery.telegram_id.between(ids[0], ids[-1])
+                )
+            )
+            delivered = set(result.scalars())
+        if not delivered:
+            return ids
+        return [chat_id for chat_id in ids if chat_id not in delivered]
+
+    async def _flush(self, job: RunningBroadcast):
+        """Write recorded deliveries, deactivations and the checkpoint in one transaction.
+
+        Also renews the job's lease and picks up a pause or cancel requested
+        from another process. If another process has taken the job over in
+        the meantime, delivery stops here.
+        """
+        async with job.flush_lock:
+            pending, job.pending = job.pending, []
+            unreachable, job.unreachable = job.unreachable, []
+            try:
+                async with self.session_maker() as session:
+                    # Renew the lease first: once another process owns the job, its
+                    # deliveries are no longer ours to record
+                    now = datetime.utcnow()
+                    result = await session.execute(
+                        update(BroadcastJob)
+                        .where(BroadcastJob.id == job.job_id, BroadcastJob.owner == self.owner_id)
+                        .values(
+                            sent=job.sent,
+                            failed=job.failed,
+                            last_telegram_id=job.checkpoint,
+                            lease_until=now + timedelta(seconds=self.lease_duration),
+                            updated_at=now
+                        )
+                        .returning(BroadcastJob.stop_requested)
+                    )
+                    row = result.first()
+                    if row is None:
+                        await session.rollback()
+                        if job.stop_reason != "lost":
+                            logger.warning(f"Lost the lease on broadcast #{job.job_id}, another process took it over")
+                            job.stop("lost")
+                        return
+                    if row.stop_requested and job.stop_reason is None:
+                        job.stop(row.stop_requested)
+                    if pending:
+                        await session.execute(
+                            dialect_insert(session, BroadcastDelivery).on_conflict_do_nothing(),
+                            pending
+                        )
+                    if unreachable:
+                        await session.execute(
+                            deactivate_users_statement(unreachable, session.bind.dialect.name)
+                        )
+                    await session.commit()
+            except BaseException as e:
+                # Keep the records so the next flush retries them, also when cancelled
+                job.pending[:0] = pending
+                job.unreachable[:0] = unreachable
+                if not isinstance(e, Exception):
+                    raise
+                logger.exception(f"Failed to checkpoint broadcast #{job.job_id}")
+                return
+            job.deactivated += len(unreachable)
+            # So their next /start re-activates them
+            forget_users(unreachable)
+
+    async def _keep_lease(self, job: RunningBroadcast):
+        # Apart from the progress reports, which wait on the Bot API. Flushing
+        # also picks up pause/cancel requests from other processes
+        interval = min(self.progress_interval, self.lease_duration / LEASE_RENEWALS)
+        while True:
+            await asyncio.sleep(interval)
+            await self._flush(job)
+
+    async def _report_progress(self, job: RunningBroadcast):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            elapsed = time.monotonic() - job.started_at
+            rate = (job.processed - job.processed_at_start) / elapsed if elapsed else 0
+            await self._edit_status(
+                job,
+                f"📢 <b>Broadcast #{job.job_id} in progress</b>\n\n"
+                f"📤 Processed: {job.processed}/{job.total}\n"
+                f"✅ Sent: {job.sent}\n"
+                f"❌ Failed: {job.failed}\n"
+                f"⚡ Rate: {rate:.1f} msg/s"
+            )
+
+    async def _report_final(self, job: RunningBroadcast, status: str):
+        titles = {
+            "completed": "✅ <b>Broadcast completed!</b>",
+            "paused": f"⏸ <b>Broadcast #{job.job_id} paused</b>\nUse /resume_broadcast {job.job_id} to continue.",
+            "cancelled": f"🚫 <b>Broadcast #{job.job_id} cancelled</b>",
+        }
+        await self._edit_status(
+            job,
+            f"{titles[status]}\n\n"
+            f"📊 <b>Statistics:</b>\n"
+            f"✅ Sent successfully: {job.sent}\n"
+            f"❌ Failed: {job.failed}\n"
+            f"🚫 Deactivated (blocked or deleted): {job.deactivated}\n"
+            f"👥 Total users: {job.total}"
+        )
+
+    async def _edit_status(self, job: RunningBroadcast, text: str):
+        if job.status_message_id is None:
+            return
+        try:
+            await self.chat_limiter.acquire(job.admin_chat_id)
+            await self.bot.edit_message_text(
+                text=text,
+                chat_id=job.admin_chat_id,
+                message_id=job.status_message_id,
+                parse_mode="HTML"
+            )
+        except TelegramBadRequest:
+            # Message is not modified or was deleted
+            pass
+        except TelegramAPIError as e:
+            logger.warning(f"Failed to update broadcast #{job.job_id} status: {e}")
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import random
+import time
+import zlib
+from collections import deque
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.services.search import tokenize
+from database.models import SupportTicket
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16
+# Mersenne prime larger than any crc32 value
+PRIME = (1 << 61) - 1
+# Tickets are re-read this far back, as write-behind may insert them late
+SYNC_OVERLAP = 60.0
+
+logger = logging.getLogger(__name__)
+
+
+def shingles(text: str) -> set[int]:
+    """Hashed word n-grams of a text"""
+    tokens = tokenize(text)
+    if len(tokens) < SHINGLE_SIZE:
+        grams = [" ".join(tokens)] if tokens else []
+    else:
+        grams = [" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)]
+    return {zlib.crc32(gram.encode()) for gram in grams}
+
+
+class _Entry(NamedTuple):
+    added_at: float
+    ticket_id: int
+    # First ticket of the group this one belongs to
+    root_id: int
+    signature: tuple[int, ...]
+
+
+class DuplicateDetector:
+    """Finds near-duplicate tickets among those created in the last `window` seconds.
+
+    Tickets are compared by MinHash signatures of their word shingles.
+    Signatures are split into `BANDS` bands for locality-sensitive hashing,
+    so a lookup only compares against tickets sharing at least one band
+    instead of scanning the whole window. A new ticket is a duplicate when
+    its estimated Jaccard similarity with a candidate reaches `threshold`.
+
+    Each process keeps its own index; `start()` polls the database every
+    `sync_interval` seconds for tickets created by other processes.
+    """
+
+    def __init__(self, window: float = 3600, threshold: float = 0.6, seed: int = 1, sync_interval: float = 5):
+        self.window = window
+        self.threshold = threshold
+        self.sync_interval = sync_interval
+        self._synced_at: datetime | None = None
+        self._task: asyncio.Task | None = None
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, PRIME), rng.randrange(PRIME)) for _ in range(NUM_PERM)]
+        self._rows = NUM_PERM // BANDS
+        self._entries: deque[_Entry] = deque()
+        self._by_id: dict[int, _Entry] = {}
+        self._buckets: dict[tuple, set[int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def signature(self, subject: str, description: str) -> tuple[int, ...]:
+        """MinHash signature of a ticket's subject and description"""
+        hashes = shingles(f"{subject}\n{description}")
+        if not hashes:
+            return ()
+        return tuple(min((a * h + b) % PRIME for h in hashes) for a, b in self._perms)
+
+    def _bands(self, signature: tuple[int, ...]):
+        for band in range(BANDS):
+            yield (band, *signature[band * self._rows:(band + 1) * self._rows])
+
+    def _expire(self, now: float):
+        while self._entries and self._entries[0].added_at < now - self.window:
+            entry = self._entries.popleft()
+            del self._by_id[entry.ticket_id]
+            for key in self._bands(entry.signature):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(entry.ticket_id)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def find(self, subject: str, description: str) -> int | None:
+        """Return the group the ticket would be a duplicate of, if any"""
+        if not self.enabled:
+            return None
+        self._expire(time.monotonic())
+        signature = self.signature(subject, description)
+        if not signature:
+            return None
+        candidates = set()
+        for key in self._bands(signature):
+            candidates |= self._buckets.get(key, set())
+        best, best_similarity = None, self.threshold
+        for ticket_id in candidates:
+            entry = self._by_id[ticket_id]
+            similarity = sum(x == y for x, y in zip(signature, entry.signature)) / NUM_PERM
+            if similarity >= best_similarity:
+                best, best_similarity = entry, similarity
+        return best.root_id if best is not None else None
+
+    def add(
+        self,
+        ticket_id: int,
+        subject: str,
+        description: str,
+        duplicate_of: int | None = None,
+        age: float = 0.0
+    ):
+        """Index a created ticket; `age` is how many seconds ago it was created"""
+        if not self.enabled or ticket_id in self._by_id:
+            return
+        signature = self.signature(subject, description)
+        if not signature:
+            return
+        entry = _Entry(time.monotonic() - age, ticket_id, duplicate_of or ticket_id, signature)
+        self._entries.append(entry)
+        self._by_id[ticket_id] = entry
+        for key in self._bands(signature):
+            self._buckets.setdefault(key, set()).add(ticket_id)
+
+    async def load_recent(self, session_maker: async_sessionmaker[AsyncSession]) -> int:
+        """Index the tickets created within the window, e.g. after a restart"""
+        if not self.enabled:
+            return 0
+        now = datetime.utcnow()
+        since = now - timedelta(seconds=self.window)
+        if self._synced_at is not None:
+            since = max(since, self._synced_at - timedelta(seconds=SYNC_OVERLAP))
+        async with session_maker() as session:
+            result = await session.execute(
+                select(
+                    SupportTicket.id,
+                    SupportTicket.subject,
+                    SupportTicket.description,
+                    SupportTicket.duplicate_of,
+                    SupportTicket.created_at
+                )
+                .where(SupportTicket.created_at > since)
+                .order_by(SupportTicket.created_at, SupportTicket.id)
+            )
+            rows = result.all()
+        self._synced_at = now
+        for ticket_id, subject, description, duplicate_of, created_at in rows:
+            self.add(ticket_id, subject, description, duplicate_of, age=(now - created_at).total_seconds())
+        return len(rows)
+
+    async def start(self, session_maker: async_sessionmaker[AsyncSession]):
+        """Load the window and keep picking up tickets created by other processes"""
+        if not self.enabled:
+            return
+        await self.load_recent(session_maker)
+        self._task = asyncio.create_task(self._loop(session_maker))
+
+    async def _loop(self, session_maker: async_sessionmaker[AsyncSession]):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                # Only reads what was created since the previous run
+                await self.load_recent(session_maker)
+            except Exception:
+                logger.exception("Duplicate index sync failed")
+
+    async def close(self):
+        """Stop the sync loop"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+from typing import NamedTuple
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardMarkup, Message
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.services.cache import TTLCache
+from database.models import SupportTicket, TicketMessage
+from database.upsert import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+
+class RelayTarget(NamedTuple):
+    """Where a relayed message belongs"""
+    ticket_id: int
+    user_id: int
+    # The counterpart message on the other side, used to keep replies threaded
+    peer_message_id: int | None
+
+
+class TicketRelay:
+    """Relays messages between ticket owners and the support chat.
+
+    Every message the bot posts on either side is mapped to its ticket in
+    the `ticket_messages` table. Lookups go through an in-memory LRU, so
+    relaying a reply normally costs one cache hit and one send; new
+    mappings are cached immediately and written to the table in batches
+    every `flush_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        session_maker: async_sessionmaker[AsyncSession],
+        support_chat_id: int | None = None,
+        cache_size: int = 50_000,
+        flush_interval: float = 0.5
+    ):
+        self.bot = bot
+        self.session_maker = session_maker
+        self.support_chat_id = support_chat_id
+        self.flush_interval = flush_interval
+        self._cache = TTLCache(maxsize=cache_size)
+        self._pending: dict[tuple[int, int], RelayTarget] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.support_chat_id is not None
+
+    def remember(self, chat_id: int, message_id: int, target: RelayTarget):
+        """Map a message to its ticket; the row is written on the next flush"""
+        key = (chat_id, message_id)
+        self._cache.set(key, target)
+        self._pending[key] = target
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def lookup(self, chat_id: int, message_id: int) -> RelayTarget | None:
+        """Return the ticket a message belongs to, or None if it isn't relayed"""
+        key = (chat_id, message_id)
+        target = self._cache.get(key)
+        if target is not None:
+            return target
+        async with self.session_maker() as session:
+            row = (await session.execute(
+                select(TicketMessage.ticket_id, TicketMessage.user_id, TicketMessage.peer_message_id)
+                .where(TicketMessage.chat_id == chat_id, TicketMessage.message_id == message_id)
+            )).first()
+        if row is None:
+            return None
+        target = RelayTarget(*row)
+        self._cache.set(key, target)
+        return target
+
+    async def publish(
+        self,
+        ticket: SupportTicket,
+        text: str,
+        confirmation: Message,
+        reply_markup: InlineKeyboardMarkup | None = None
+    ):
+        """Post a new ticket to the support chat and link it with the user's confirmation"""
+        if not self.enabled:
+            return
+        card = await self.bot.send_message(
+            self.support_chat_id,
+            text,
+            parse_mode="HTML",
+            reply_markup=reply_markup
+        )
+        self.remember(card.chat.id, card.message_id, RelayTarget(ticket.id, ticket.user_id, confirmation.message_id))
+        self.remember(confirmation.chat.id, confirmation.message_id, RelayTarget(ticket.id, ticket.user_id, card.message_id))
+
+    async def to_user(self, message: Message, target: RelayTarget) -> Message:
+        """Copy a support chat reply to the ticket owner"""
+        sent = await self.bot.copy_message(
+            chat_id=target.user_id,
+            from_chat_id=message.chat.id,
+            message_id=message.message_id,
+            reply_to_message_id=target.peer_message_id,
+            allow_sending_without_reply=True
+        )
+        self.remember(target.user_id, sent.message_id, RelayTarget(target.ticket_id, target.user_id, message.message_id))
+        return sent
+
+    async def to_support(self, message: Message, target: RelayTarget) -> Message:
+        """Copy a user's follow-up into the ticket's thread in the support chat"""
+        sent = await self.bot.copy_message(
+            chat_id=self.support_chat_id,
+            from_chat_id=message.chat.id,
+            message_id=message.message_id,
+            reply_to_message_id=target.peer_message_id,
+            allow_sending_without_reply=True
+        )
+        self.remember(self.support_chat_id, sent.message_id, RelayTarget(target.ticket_id, target.user_id, message.message_id))
+        return sent
+
+    async def flush(self):
+        """Write pending mappings in one multi-row insert"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            rows = [
+                {"chat_id": chat_id, "message_id": message_id, **target._asdict()}
+                for (chat_id, message_id), target in pending.items()
+            ]
+            try:
+                async with self.session_maker() as session:
+                    statement = dialect_insert(session, TicketMessage).values(rows)
+                    await session.execute(statement.on_conflict_do_nothing())
+                    await session.commit()
+            except BaseException:
+                self._pending = {**pending, **self._pending}
+                raise
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception(f"Failed to save {len(self._pending)} relay mapping(s)")
+
+    async def close(self):
+        """Stop the flush loop and save the remaining mappings"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception(f"Lost {len(self._pending)} relay mapping(s) on shutdown")
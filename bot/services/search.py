@@ -0,0 +1,146 @@
+import asyncio
+import math
+import re
+
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import SupportTicket
+
+# Must match the text search configuration of the generated column (migration 0006)
+SEARCH_CONFIG = "simple"
+# Only the newest matches are ranked, which bounds the cost of very common terms
+MAX_CANDIDATES = 1000
+SUBJECT_WEIGHT = 2.0
+REFRESH_BATCH_SIZE = 5000
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase word tokens"""
+    return TOKEN_RE.findall(text.lower())
+
+
+class InvertedIndex:
+    """In-memory inverted index over ticket subjects and descriptions.
+
+    Used instead of PostgreSQL full-text search on SQLite. Like
+    `websearch_to_tsquery`, a ticket matches only if it contains every
+    query token; matches are scored by TF-IDF with subject hits weighted
+    higher.
+    """
+
+    def __init__(self):
+        # token -> {ticket_id: weighted term frequency}
+        self._postings: dict[str, dict[int, float]] = {}
+        self.max_id = 0
+        self.size = 0
+
+    def add(self, ticket_id: int, subject: str, description: str):
+        weights: dict[str, float] = {}
+        for token in tokenize(subject):
+            weights[token] = weights.get(token, 0.0) + SUBJECT_WEIGHT
+        for token in tokenize(description):
+            weights[token] = weights.get(token, 0.0) + 1.0
+        for token, weight in weights.items():
+            self._postings.setdefault(token, {})[ticket_id] = weight
+        self.max_id = max(self.max_id, ticket_id)
+        self.size += 1
+
+    def search(self, query: str) -> list[int]:
+        """Return matching ticket IDs, best first"""
+        tokens = set(tokenize(query))
+        postings = [self._postings.get(token) for token in tokens]
+        if not postings or not all(postings):
+            return []
+        # Intersect starting from the rarest token
+        postings.sort(key=len)
+        matches = set(postings[0]).intersection(*postings[1:])
+        idf = [math.log(1 + self.size / len(posting)) for posting in postings]
+        scores = {
+            ticket_id: sum(posting[ticket_id] * weight for posting, weight in zip(postings, idf))
+            for ticket_id in matches
+        }
+        return sorted(scores, key=lambda ticket_id: (-scores[ticket_id], -ticket_id))
+
+
+class TicketSearch:
+    """Ranked full-text search over support tickets.
+
+    On PostgreSQL it queries the GIN-indexed `search_vector` column. On
+    other databases it keeps an `InvertedIndex` that is filled on first use
+    and picks up newer tickets before every search.
+    """
+
+    def __init__(self):
+        self._index = InvertedIndex()
+        self._refresh_lock = asyncio.Lock()
+
+    async def search(
+        self,
+        session: AsyncSession,
+        query: str,
+        offset: int = 0,
+        limit: int = 5
+    ) -> list[SupportTicket]:
+        """Return up to `limit` tickets matching `query`, best match first"""
+        if session.bind.dialect.name == "postgresql":
+            return await self._search_postgres(session, query, offset, limit)
+        return await self._search_index(session, query, offset, limit)
+
+    async def _search_postgres(
+        self,
+        session: AsyncSession,
+        query: str,
+        offset: int,
+        limit: int
+    ) -> list[SupportTicket]:
+        search_vector = literal_column("support_tickets.search_vector")
+        tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+        candidates = (
+            select(SupportTicket.id, func.ts_rank_cd(search_vector, tsquery).label("rank"))
+            .where(search_vector.op("@@")(tsquery))
+            .order_by(SupportTicket.id.desc())
+            .limit(MAX_CANDIDATES)
+            .subquery()
+        )
+        result = await session.execute(
+            select(SupportTicket)
+            .join(candidates, candidates.c.id == SupportTicket.id)
+            .order_by(candidates.c.rank.desc(), SupportTicket.id.desc())
+            .offset(offset)
+            .limit(limit)
+        )
+        return list(result.scalars())
+
+    async def _search_index(
+        self,
+        session: AsyncSession,
+        query: str,
+        offset: int,
+        limit: int
+    ) -> list[SupportTicket]:
+        await self._refresh(session)
+        ids = self._index.search(query)[offset:offset + limit]
+        if not ids:
+            return []
+        result = await session.execute(select(SupportTicket).where(SupportTicket.id.in_(ids)))
+        tickets = {ticket.id: ticket for ticket in result.scalars()}
+        return [tickets[ticket_id] for ticket_id in ids if ticket_id in tickets]
+
+    async def _refresh(self, session: AsyncSession):
+        """Index tickets created since the last refresh"""
+        async with self._refresh_lock:
+            while True:
+                result = await session.execute(
+                    select(SupportTicket.id, SupportTicket.subject, SupportTicket.description)
+                    .where(SupportTicket.id > self._index.max_id)
+                    .order_by(SupportTicket.id)
+                    .limit(REFRESH_BATCH_SIZE)
+                )
+                rows = result.all()
+                for row in rows:
+                    self._index.add(*row)
+                if len(rows) < REFRESH_BATCH_SIZE:
+                    return
@@ -0,0 +1,291 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from html import escape
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from sqlalchemy import delete, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.keyboards.keyboards import get_ticket_actions_keyboard
+from bot.metrics import SLA_ACTIONS
+from database.models import SupportTicket, TicketDeadline
+from database.upsert import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+FOLLOW_UP = "follow_up"
+ESCALATE = "escalate"
+AUTO_CLOSE = "auto_close"
+# Deadline kind -> ticket statuses it still applies to; in any other status it is dropped
+APPLIES_TO = {
+    FOLLOW_UP: ("open", "in_progress"),
+    ESCALATE: ("open",),
+    AUTO_CLOSE: ("resolved",),
+}
+# Most deadlines held in memory at a time; later ones are loaded as these are handled
+HEAP_LIMIT = 50_000
+SEND_CONCURRENCY = 8
+RETRY_DELAY = 5.0
+
+
+def format_duration(seconds: float) -> str:
+    """Rough human-readable duration, e.g. "45 min", "4 h" or "3 d\""""
+    if seconds < 3600:
+        return f"{round(seconds / 60)} min"
+    if seconds < 86400:
+        return f"{round(seconds / 3600)} h"
+    return f"{round(seconds / 86400)} d"
+
+
+class SLAScheduler:
+    """Follow-ups, escalation and auto-close of tickets on a schedule.
+
+    Deadlines live in the `ticket_deadlines` table, one row per ticket and
+    kind. A single loop keeps the deadlines of the next `lookahead` seconds
+    in a heap and sleeps until the earliest one; when it is due, every due
+    row is claimed `batch_size` at a time with FOR UPDATE SKIP LOCKED,
+    handled and deleted. A deadline whose ticket has moved on (e.g. an
+    escalation for a ticket that has been claimed) is simply dropped, so
+    status changes never have to cancel anything.
+
+    Safe to run in several processes on PostgreSQL: each keeps its own heap,
+    and whichever claims a due row first handles it.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        session_maker: async_sessionmaker[AsyncSession],
+        admin_ids: list[int],
+        follow_up_after: float = 0,
+        escalate_after: float = 0,
+        auto_close_after: float = 0,
+        batch_size: int = 500,
+        lookahead: float = 300
+    ):
+        self.bot = bot
+        self.session_maker = session_maker
+        self.admin_ids = admin_ids
+        self.follow_up_after = follow_up_after
+        self.escalate_after = escalate_after
+        self.auto_close_after = auto_close_after
+        self.batch_size = batch_size
+        self.lookahead = lookahead
+        self._heap: list[datetime] = []
+        # Every deadline up to this time is in the heap
+        self._loaded_until = datetime.min
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(SEND_CONCURRENCY)
+        self._process_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.follow_up_after > 0 or self.escalate_after > 0 or self.auto_close_after > 0
+
+    async def start(self):
+        """Start the timer loop, if any deadline kind is enabled"""
+        if self.enabled:
+            self._task = asyncio.create_task(self._loop())
+
+    def ticket_created(self, ticket_id: int, created_at: datetime) -> list[tuple[int, str, datetime]]:
+        """Follow-up and escalation deadlines of a new ticket"""
+        deadlines = []
+        if self.follow_up_after > 0:
+            deadlines.append((ticket_id, FOLLOW_UP, created_at + timedelta(seconds=self.follow_up_after)))
+        if self.escalate_after > 0:
+            deadlines.append((ticket_id, ESCALATE, created_at + timedelta(seconds=self.escalate_after)))
+        return deadlines
+
+    def ticket_resolved(self, ticket_id: int) -> list[tuple[int, str, datetime]]:
+        """Auto-close deadline of a resolved ticket"""
+        if self.auto_close_after <= 0:
+            return []
+        return [(ticket_id, AUTO_CLOSE, datetime.utcnow() + timedelta(seconds=self.auto_close_after))]
+
+    async def schedule(self, session: AsyncSession, deadlines: list[tuple[int, str, datetime]]):
+        """Add or move (ticket_id, kind, due_at) deadlines in the caller's transaction.
+
+        Pass them to `scheduled()` once it is committed.
+        """
+        if not deadlines:
+            return
+        rows = [{"ticket_id": ticket_id, "kind": kind, "due_at": due_at} for ticket_id, kind, due_at in deadlines]
+        statement = dialect_insert(session, TicketDeadline).values(rows)
+        await session.execute(statement.on_conflict_do_update(
+            index_elements=["ticket_id", "kind"],
+            set_={"due_at": statement.excluded.due_at}
+        ))
+
+    def scheduled(self, deadlines: list[tuple[int, str, datetime]]):
+        """Wake the timer loop for committed deadlines that are due before its next refill"""
+        self._push(due_at for _, _, due_at in deadlines)
+
+    def _push(self, due_times):
+        if self._task is None:
+            return
+        earliest = self._heap[0] if self._heap else None
+        for due_at in due_times:
+            # Later ones are picked up by the next refill
+            if due_at <= self._loaded_until:
+                heapq.heappush(self._heap, due_at)
+        if self._heap and self._heap[0] != earliest:
+            self._wakeup.set()
+
+    async def _loop(self):
+        while True:
+            try:
+                if datetime.utcnow() >= self._loaded_until:
+                    await self._refill()
+                now = datetime.utcnow()
+                if self._heap and self._heap[0] <= now:
+                    while self._heap and self._heap[0] <= now:
+                        heapq.heappop(self._heap)
+                    await self.process_due()
+                    continue
+                self._wakeup.clear()
+                until = min(self._heap[0], self._loaded_until) if self._heap else self._loaded_until
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=(until - now).total_seconds())
+                except asyncio.TimeoutError:
+                    pass
+            except Exception:
+                logger.exception("SLA scheduler run failed")
+                await asyncio.sleep(RETRY_DELAY)
+
+    async def _refill(self):
+        """Load the deadlines of the next `lookahead` seconds into the heap"""
+        horizon = datetime.utcnow() + timedelta(seconds=self.lookahead)
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(TicketDeadline.due_at)
+                .where(TicketDeadline.due_at <= horizon)
+                .order_by(TicketDeadline.due_at)
+                .limit(HEAP_LIMIT)
+            )
+            # Already sorted, so already a valid heap
+            self._heap = list(result.scalars())
+        self._loaded_until = self._heap[-1] if len(self._heap) == HEAP_LIMIT else horizon
+
+    async def process_due(self) -> int:
+        """Handle every deadline that is due, batch by batch; returns how many were handled"""
+        total = 0
+        async with self._process_lock:
+            while True:
+                handled = await self._process_batch()
+                total += handled
+                if handled < self.batch_size:
+                    return total
+
+    async def _process_batch(self) -> int:
+        now = datetime.utcnow()
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(TicketDeadline.ticket_id, TicketDeadline.kind)
+                .where(TicketDeadline.due_at <= now)
+                .order_by(TicketDeadline.due_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            deadlines = result.all()
+            if not deadlines:
+                return 0
+            result = await session.execute(
+                select(SupportTicket).where(SupportTicket.id.in_({ticket_id for ticket_id, _ in deadlines}))
+            )
+            tickets = {ticket.id: ticket for ticket in result.scalars()}
+
+            due: dict[str, list[SupportTicket]] = {FOLLOW_UP: [], ESCALATE: [], AUTO_CLOSE: []}
+            for ticket_id, kind in deadlines:
+                ticket = tickets.get(ticket_id)
+                if ticket is not None and ticket.status in APPLIES_TO.get(kind, ()):
+                    due[kind].append(ticket)
+                else:
+                    SLA_ACTIONS.inc(("expired",))
+            await session.execute(
+                delete(TicketDeadline)
+                .where(tuple_(TicketDeadline.ticket_id, TicketDeadline.kind).in_([tuple(row) for row in deadlines]))
+                .execution_options(synchronize_session=False)
+            )
+
+            # Follow-ups repeat for as long as the ticket is unresolved
+            next_follow_up = now + timedelta(seconds=self.follow_up_after)
+            if due[FOLLOW_UP] and self.follow_up_after > 0:
+                await session.execute(insert(TicketDeadline).values([
+                    {"ticket_id": ticket.id, "kind": FOLLOW_UP, "due_at": next_follow_up}
+                    for ticket in due[FOLLOW_UP]
+                ]))
+            if due[AUTO_CLOSE]:
+                result = await session.execute(
+                    update(SupportTicket)
+                    .where(
+                        SupportTicket.id.in_([ticket.id for ticket in due[AUTO_CLOSE]]),
+                        SupportTicket.status == "resolved"
+                    )
+                    .values(status="closed", updated_at=now)
+                    .returning(SupportTicket.id)
+                    .execution_options(synchronize_session=False)
+                )
+                closed = set(result.scalars())
+                due[AUTO_CLOSE] = [ticket for ticket in due[AUTO_CLOSE] if ticket.id in closed]
+            await session.commit()
+
+        if due[FOLLOW_UP] and self.follow_up_after > 0:
+            self._push([next_follow_up])
+        # Sent once the batch is committed: a crash loses a notification rather than repeating it
+        sends = [self._follow_up(ticket) for ticket in due[FOLLOW_UP]]
+        sends += [self._escalate(ticket) for ticket in due[ESCALATE]]
+        sends += [self._auto_closed(ticket) for ticket in due[AUTO_CLOSE]]
+        await asyncio.gather(*sends)
+        for kind, handled in due.items():
+            if handled:
+                SLA_ACTIONS.inc((kind,), amount=len(handled))
+        return len(deadlines)
+
+    async def _follow_up(self, ticket: SupportTicket):
+        await self._send(
+            ticket.user_id,
+            f"⏳ We're still working on your ticket #{ticket.id} ({escape(ticket.subject)}).\n"
+            "Thank you for your patience!"
+        )
+
+    async def _escalate(self, ticket: SupportTicket):
+        waiting = format_duration((datetime.utcnow() - ticket.created_at).total_seconds())
+        text = (
+            f"🚨 <b>Ticket #{ticket.id} has been waiting for {waiting}</b>\n\n"
+            f"📝 Subject: {escape(ticket.subject)}\n"
+            f"👤 User ID: {ticket.user_id}\n\n"
+            "Nobody has claimed it yet."
+        )
+        keyboard = get_ticket_actions_keyboard(ticket)
+        await asyncio.gather(*(self._send(admin_id, text, keyboard) for admin_id in self.admin_ids))
+
+    async def _auto_closed(self, ticket: SupportTicket):
+        await self._send(
+            ticket.user_id,
+            f"🔒 Your ticket #{ticket.id} has been closed automatically, as it was resolved "
+            f"{format_duration(self.auto_close_after)} ago.\n"
+            "Create a new ticket if you still need help."
+        )
+
+    async def _send(self, chat_id: int, text: str, reply_markup=None):
+        async with self._semaphore:
+            while True:
+                try:
+                    await self.bot.send_message(chat_id, text, parse_mode="HTML", reply_markup=reply_markup)
+                    return
+                except TelegramRetryAfter as e:
+                    await asyncio.sleep(e.retry_after)
+                except TelegramAPIError as e:
+                    logger.debug(f"Could not send an SLA notification to {chat_id}: {e}")
+                    return
+
+    async def close(self):
+        """Stop the timer loop"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
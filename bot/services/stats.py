@@ -0,0 +1,88 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from sqlalchemy import String, cast, func, literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.services.cache import TTLCache
+from database.models import SupportTicket, User
+
+STATS_TTL = 30.0
+STATS_DAYS = 7
+
+
+@dataclass(frozen=True)
+class StatsSnapshot:
+    """Aggregated bot statistics at a point in time"""
+    total_users: int = 0
+    active_users: int = 0
+    total_tickets: int = 0
+    tickets_by_status: dict[str, int] = field(default_factory=dict)
+    tickets_by_day: dict[str, int] = field(default_factory=dict)
+    generated_at: datetime = field(default_factory=datetime.utcnow)
+
+
+def stats_query(days: int = STATS_DAYS):
+    """All statistics as (metric, key, value, extra) rows in a single round trip"""
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    users = select(
+        literal("users").label("metric"),
+        cast(literal(""), String).label("key"),
+        func.count().label("value"),
+        func.count().filter(User.is_active == True).label("extra")
+    ).select_from(User)
+    by_status = select(
+        literal("status"),
+        cast(SupportTicket.status, String),
+        func.count(),
+        literal(0)
+    ).group_by(SupportTicket.status)
+    day = cast(func.date(SupportTicket.created_at), String)
+    by_day = select(
+        literal("day"),
+        day,
+        func.count(),
+        literal(0)
+    ).where(SupportTicket.created_at >= since).group_by(day)
+    return union_all(users, by_status, by_day)
+
+
+async def collect_stats(session: AsyncSession, days: int = STATS_DAYS) -> StatsSnapshot:
+    """Compute statistics with COUNT aggregates instead of loading rows"""
+    result = await session.execute(stats_query(days))
+    total_users = active_users = 0
+    by_status: dict[str, int] = {}
+    by_day: dict[str, int] = {}
+    for metric, key, value, extra in result:
+        if metric == "users":
+            total_users, active_users = value, extra
+        elif metric == "status":
+            by_status[key] = by_status.get(key, 0) + value
+        else:
+            by_day[key] = value
+    return StatsSnapshot(
+        total_users=total_users,
+        active_users=active_users,
+        total_tickets=sum(by_status.values()),
+        tickets_by_status=dict(sorted(by_status.items())),
+        tickets_by_day=dict(sorted(by_day.items()))
+    )
+
+
+_cache = TTLCache(maxsize=1, ttl=STATS_TTL)
+_lock = asyncio.Lock()
+
+
+async def get_stats(session: AsyncSession) -> StatsSnapshot:
+    """Return cached statistics, recomputing them at most once per STATS_TTL"""
+    snapshot = _cache.get("stats")
+    if snapshot is not None:
+        return snapshot
+    async with _lock:
+        # Another caller may have refreshed the snapshot while we waited
+        snapshot = _cache.get("stats")
+        if snapshot is None:
+            snapshot = await collect_stats(session)
+            _cache.set("stats", snapshot)
+    return snapshot
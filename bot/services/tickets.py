@@ -0,0 +1,280 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy import func, insert, select, tuple_, update
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.services.sla import SLAScheduler
+from database.models import SupportTicket
+
+logger = logging.getLogger(__name__)
+
+FLUSH_RETRIES = 5
+# Lengths of the String(255) columns of support_tickets
+SUBJECT_MAX_LENGTH = 255
+CONTACT_MAX_LENGTH = 255
+TICKET_STATUSES = ("open", "in_progress", "resolved", "closed")
+# action -> (statuses the ticket may be in, new status)
+TRANSITIONS = {
+    "claim": (("open",), "in_progress"),
+    "resolve": (("in_progress",), "resolved"),
+    "close": (("open", "in_progress", "resolved"), "closed"),
+}
+
+
+async def list_tickets(
+    session: AsyncSession,
+    status: str,
+    after_id: int | None = None,
+    limit: int = 5
+) -> list[SupportTicket]:
+    """Return the next page of tickets with the given status, oldest first.
+
+    Uses keyset pagination on (status, created_at, id), which is served by
+    the ix_support_tickets_status_created index no matter how deep the page.
+    """
+    query = (
+        select(SupportTicket)
+        .where(SupportTicket.status == status)
+        .order_by(SupportTicket.created_at, SupportTicket.id)
+        .limit(limit)
+    )
+    if after_id is not None:
+        after_created_at = (
+            select(SupportTicket.created_at)
+            .where(SupportTicket.id == after_id)
+            .scalar_subquery()
+        )
+        query = query.where(
+            tuple_(SupportTicket.created_at, SupportTicket.id) > tuple_(after_created_at, after_id)
+        )
+    result = await session.execute(query)
+    return list(result.scalars())
+
+
+async def transition_ticket(
+    session: AsyncSession,
+    ticket_id: int,
+    action: str,
+    admin_id: int,
+    sla: SLAScheduler | None = None
+) -> SupportTicket | None:
+    """Apply a status transition with a conditional UPDATE.
+
+    A resolved ticket's auto-close deadline is written by `sla` in the same
+    transaction. Returns the updated ticket, or None if it was not in a
+    status the action applies to (e.g. another admin claimed it first).
+    """
+    from_statuses, to_status = TRANSITIONS[action]
+    values = {"status": to_status, "updated_at": datetime.utcnow()}
+    if action == "claim":
+        values["assigned_to"] = admin_id
+    result = await session.execute(
+        update(SupportTicket)
+        .where(SupportTicket.id == ticket_id, SupportTicket.status.in_(from_statuses))
+        .values(**values)
+        .returning(SupportTicket)
+        # The ticket may already be in the session, e.g. loaded to render it: bring it up
+        # to date, from the RETURNING row rather than an extra SELECT
+        .execution_options(synchronize_session="fetch")
+    )
+    ticket = result.scalar_one_or_none()
+    deadlines = []
+    if ticket is not None and action == "resolve" and sla is not None:
+        deadlines = sla.ticket_resolved(ticket.id)
+        await sla.schedule(session, deadlines)
+    await session.commit()
+    if deadlines:
+        sla.scheduled(deadlines)
+    return ticket
+
+
+class TicketService:
+    """Creates support tickets, optionally through a write-behind queue.
+
+    In write-behind mode ticket IDs are handed out from blocks pre-allocated
+    from the `support_tickets` id sequence, so the user gets a confirmation
+    immediately. Tickets are then written with multi-row INSERTs once
+    `batch_size` are queued or every `flush_interval` seconds, and
+    everything still queued is flushed on close().
+
+    The SLA deadlines of a ticket are written in the same transaction as
+    the ticket itself, so there are never deadlines for unsaved tickets.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        write_behind: bool = False,
+        batch_size: int = 100,
+        flush_interval: float = 0.5,
+        id_block_size: int = 100,
+        sla: SLAScheduler | None = None
+    ):
+        self.session_maker = session_maker
+        self.sla = sla
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.id_block_size = id_block_size
+        self._ids: list[int] = []
+        self._id_lock = asyncio.Lock()
+        self._queue: list[dict] = []
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        """Check that write-behind is usable and start the flush loop"""
+        if not self.write_behind:
+            return
+        async with self.session_maker() as session:
+            if session.bind.dialect.name != "postgresql":
+                logger.warning("Ticket write-behind needs PostgreSQL sequences, writing tickets directly")
+                self.write_behind = False
+                return
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def create(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        subject: str,
+        description: str,
+        contact_info: str | None = None,
+        duplicate_of: int | None = None
+    ) -> SupportTicket:
+        """Create a ticket and return it with its ID assigned"""
+        if not self.write_behind:
+            ticket = SupportTicket(
+                user_id=user_id,
+                subject=subject,
+                description=description,
+                contact_info=contact_info,
+                duplicate_of=duplicate_of
+            )
+            session.add(ticket)
+            deadlines = []
+            if self.sla is not None:
+                # Assigns the ID and created_at the deadlines are based on
+                await session.flush()
+                deadlines = self.sla.ticket_created(ticket.id, ticket.created_at)
+                await self.sla.schedule(session, deadlines)
+            await session.commit()
+            if deadlines:
+                self.sla.scheduled(deadlines)
+            return ticket
+
+        ticket = SupportTicket(
+            id=await self._next_id(),
+            user_id=user_id,
+            subject=subject,
+            description=description,
+            contact_info=contact_info,
+            duplicate_of=duplicate_of,
+            status="open",
+            created_at=datetime.utcnow()
+        )
+        self._queue.append({
+            "id": ticket.id,
+            "user_id": ticket.user_id,
+            "subject": ticket.subject,
+            "description": ticket.description,
+            "contact_info": ticket.contact_info,
+            "duplicate_of": ticket.duplicate_of,
+            "status": ticket.status,
+            "created_at": ticket.created_at,
+        })
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+        return ticket
+
+    async def _next_id(self) -> int:
+        async with self._id_lock:
+            if not self._ids:
+                async with self.session_maker() as session:
+                    result = await session.execute(
+                        select(func.nextval(func.pg_get_serial_sequence("support_tickets", "id")))
+                        .select_from(func.generate_series(1, self.id_block_size))
+                    )
+                    self._ids = sorted(result.scalars(), reverse=True)
+            return self._ids.pop()
+
+    async def flush(self):
+        """Write all queued tickets, in multi-row INSERTs of `batch_size` rows.
+
+        A backlog built up during an outage may be far larger than one
+        statement can bind, hence the chunks. Each chunk is committed on its
+        own; on the first failure it and the chunks after it go back in the
+        queue, while the ones already written stay written. A chunk the
+        database rejects for its data is retried row by row instead, and the
+        rejected rows are logged and dropped, so they can't hold up the queue.
+        """
+        async with self._flush_lock:
+            if not self._queue:
+                return
+            rows, self._queue = self._queue, []
+            written = 0
+            try:
+                while written < len(rows):
+                    chunk = rows[written:written + self.batch_size]
+                    try:
+                        await self._insert(chunk)
+                        written += len(chunk)
+                    except (DataError, IntegrityError):
+                        logger.warning(f"{len(chunk)} queued ticket(s) rejected, writing them one by one")
+                        for row in chunk:
+                            try:
+                                await self._insert([row])
+                            except (DataError, IntegrityError) as e:
+                                logger.error(f"Dropped a ticket the database rejected: {row} ({e.orig})")
+                            written += 1
+            except BaseException:
+                # Keep the unwritten tickets queued for the next attempt, also when cancelled
+                self._queue[:0] = rows[written:]
+                raise
+
+    async def _insert(self, rows: list[dict]):
+        """Write tickets and their SLA deadlines in one transaction"""
+        deadlines = []
+        if self.sla is not None:
+            for row in rows:
+                deadlines += self.sla.ticket_created(row["id"], row["created_at"])
+        async with self.session_maker() as session:
+            await session.execute(insert(SupportTicket).values(rows))
+            if self.sla is not None:
+                await self.sla.schedule(session, deadlines)
+            await session.commit()
+        if deadlines:
+            self.sla.scheduled(deadlines)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception(f"Failed to flush {len(self._queue)} queued ticket(s)")
+
+    async def close(self):
+        """Stop the flush loop and write everything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for attempt in range(FLUSH_RETRIES):
+            try:
+                await self.flush()
+                return
+            except Exception as e:
+                logger.warning(f"Final ticket flush failed (attempt {attempt + 1}/{FLUSH_RETRIES}): {e}")
+                await asyncio.sleep(2 ** attempt)
+        # Last resort: make sure the tickets are at least in the logs
+        for row in self._queue:
+            logger.error(f"Unsaved ticket: {row}")
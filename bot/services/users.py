@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from aiogram.types import User as TelegramUser
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.services.cache import TTLCache
+from database.models import User
+from database.upsert import dialect_insert
+
+KNOWN_USERS_MAXSIZE = 100_000
+KNOWN_USERS_TTL = 3600.0
+# Deactivations are re-read this far back, for transactions that committed late
+SYNC_OVERLAP = 60.0
+
+logger = logging.getLogger(__name__)
+
+# telegram_id -> (username, first_name, last_name) last written to the database
+_known_users = TTLCache(maxsize=KNOWN_USERS_MAXSIZE, ttl=KNOWN_USERS_TTL)
+
+
+async def register_user(session: AsyncSession, user: TelegramUser) -> bool:
+    """Make sure the user exists, is active and has an up-to-date profile.
+
+    Repeat visitors whose profile hasn't changed are answered from an
+    in-process cache without touching the database. Everyone else goes
+    through a single INSERT ... ON CONFLICT DO UPDATE, which is safe against
+    concurrent /start updates and re-activates users who had blocked the bot.
+
+    Returns True if the user was created by this call.
+    """
+    profile = (user.username, user.first_name, user.last_name)
+    if _known_users.get(user.id) == profile:
+        return False
+
+    now = datetime.utcnow()
+    statement = dialect_insert(session, User).values(
+        telegram_id=user.id,
+        username=user.username,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        created_at=now,
+        is_active=True
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={
+            "username": statement.excluded.username,
+            "first_name": statement.excluded.first_name,
+            "last_name": statement.excluded.last_name,
+            "is_active": True,
+            "deactivated_at": None,
+        }
+    ).returning(User.created_at)
+    created_at = await session.scalar(statement)
+    await session.commit()
+
+    _known_users.set(user.id, profile)
+    # created_at is only ours if the row was inserted rather than updated
+    return created_at == now
+
+
+def forget_users(telegram_ids: Iterable[int]):
+    """Drop users from the cache, e.g. after they were deactivated"""
+    for telegram_id in telegram_ids:
+        _known_users.pop(telegram_id)
+
+
+class UserCacheSync:
+    """Drops users deactivated by other processes from this process's cache.
+
+    Broadcasts deactivate the users who blocked the bot in whichever process
+    delivers them. Every `interval` seconds this polls for recent
+    deactivations, so that the next /start of such a user re-activates them
+    here as well.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession], interval: float = 10):
+        self.session_maker = session_maker
+        self.interval = interval
+        self._since = datetime.utcnow()
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        """Start the polling loop"""
+        self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("User cache sync failed")
+
+    async def sync(self) -> int:
+        """Forget the users deactivated since the last sync; returns how many were found"""
+        now = datetime.utcnow()
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(User.telegram_id)
+                .where(User.deactivated_at > self._since - timedelta(seconds=SYNC_OVERLAP))
+            )
+            telegram_ids = list(result.scalars())
+        forget_users(telegram_ids)
+        self._since = now
+        return len(telegram_ids)
+
+    async def close(self):
+        """Stop the polling loop"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
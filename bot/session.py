@@ -0,0 +1,37 @@
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiohttp import FormData
+
+from bot.templates import serialized_markup
+
+
+class PreparedMarkupSession(AiohttpSession):
+    """Aiohttp session that sends frozen reply markups as pre-serialized JSON.
+
+    Markups registered with `freeze_markup()` skip the per-request
+    model_dump() and json.dumps(); everything else is encoded as usual.
+    """
+
+    def build_form_data(self, bot: Bot, method: TelegramMethod[TelegramType]) -> FormData:
+        markup = getattr(method, "reply_markup", None)
+        prepared = serialized_markup(markup) if markup is not None else None
+        if prepared is None:
+            return super().build_form_data(bot, method)
+
+        form = FormData(quote_fields=False)
+        files = {}
+        for key, value in method.model_dump(warnings=False, exclude={"reply_markup"}).items():
+            value = self.prepare_value(value, bot=bot, files=files)
+            if not value:
+                continue
+            form.add_field(key, value)
+        form.add_field("reply_markup", prepared)
+        for key, value in files.items():
+            form.add_field(
+                key,
+                value.read(bot),
+                filename=value.filename or key,
+            )
+        return form
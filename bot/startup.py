@@ -0,0 +1,148 @@
+import asyncio
+import importlib
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from aiogram import Bot, Router
+from sqlalchemy import text
+
+from config import Config
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+# Registration order matters: the relay router must come after the handlers it falls back from
+ROUTER_MODULES = (
+    "bot.handlers.basic",
+    "bot.handlers.support",
+    "bot.handlers.admin",
+    "bot.handlers.relay",
+)
+
+
+def load_routers() -> list[Router]:
+    """Import the handler modules and return their routers in registration order"""
+    return [importlib.import_module(name).router for name in ROUTER_MODULES]
+
+
+class StartupProfile:
+    """Wall-clock start offset and duration of each startup phase.
+
+    Phases may overlap, so the report lists when each one started relative
+    to `origin` (the first line of main.py) next to how long it took.
+    """
+
+    def __init__(self, origin: float, enabled: bool = False):
+        self.origin = origin
+        self.enabled = enabled
+        self.phases: list[tuple[str, float, float]] = []
+
+    def record(self, name: str, start: float, end: float):
+        self.phases.append((name, start - self.origin, end - start))
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def report(self) -> str:
+        width = max((len(name) for name, _, _ in self.phases), default=0)
+        lines = ["Startup profile (start / duration, seconds):"]
+        for name, offset, duration in sorted(self.phases, key=lambda phase: phase[1]):
+            lines.append(f"  {name:<{width}}  {offset:7.3f}  {duration:7.3f}")
+        return "\n".join(lines)
+
+    async def ready(self):
+        """Dispatcher startup hook: log the time it took to become ready for updates"""
+        elapsed = time.perf_counter() - self.origin
+        logger.info(f"Ready for updates {elapsed:.2f} s after start")
+        if self.enabled:
+            logger.info(self.report())
+
+
+def backoff_delays(attempts: int, base: float = 0.5, cap: float = 30.0):
+    """Exponential backoff with full jitter: a random delay up to base * 2**n, capped"""
+    for attempt in range(attempts - 1):
+        yield random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def wait_for_database(db: Database, attempts: int = 8):
+    """Apply migrations, retrying with backoff while the database is unreachable"""
+    delays = backoff_delays(attempts)
+    for attempt in range(1, attempts + 1):
+        try:
+            if await db.run_migrations():
+                logger.info("Database migrations applied")
+            else:
+                logger.info("Database schema is up to date")
+            return
+        except Exception as e:
+            delay = next(delays, None)
+            if delay is None:
+                logger.error(f"Failed to connect to database after {attempts} attempts")
+                raise
+            logger.warning(
+                f"Database connection failed (attempt {attempt}/{attempts}): {e}; "
+                f"retrying in {delay:.1f} s"
+            )
+            await asyncio.sleep(delay)
+
+
+async def warm_pool(db: Database, connections: int):
+    """Open `connections` pooled connections up front so the first updates don't pay for them"""
+    async def ping():
+        async with db.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    # Held concurrently, so the pool has to open one connection per ping
+    await asyncio.gather(*(ping() for _ in range(connections)))
+
+
+async def warm_bot(bot: Bot):
+    """Call getMe once: caches the bot user for start_polling and opens the API connection"""
+    me = await bot.me()
+    logger.info(f"Authorized as @{me.username}")
+
+
+async def warm_up(
+    config: Config,
+    bot: Bot,
+    db: Database,
+    profile: StartupProfile,
+    migrate: bool = True,
+    pool: bool = True
+) -> list[Router]:
+    """Get the schema, connection pool, Bot API connection and routers ready concurrently.
+
+    Returns the loaded routers, to be passed on to create_dispatcher().
+    """
+    async def database():
+        if migrate:
+            with profile.phase("migrations"):
+                await wait_for_database(db, config.db.connect_retries)
+        if pool and config.db.pool_warmup > 0:
+            with profile.phase("pool warm-up"):
+                await warm_pool(db, min(config.db.pool_warmup, config.db.pool_size))
+
+    async def api():
+        with profile.phase("getMe"):
+            await warm_bot(bot)
+
+    async def routers():
+        with profile.phase("routers"):
+            return await asyncio.to_thread(load_routers)
+
+    tasks = [asyncio.ensure_future(step()) for step in (database, api, routers)]
+    try:
+        _, _, loaded = await asyncio.gather(*tasks)
+    except BaseException:
+        # One failure (e.g. a bad token) shouldn't leave the others retrying
+        for task in tasks:
+            task.cancel()
+        raise
+    return loaded
@@ -0,0 +1,176 @@
+import json
+from types import MappingProxyType
+from typing import Mapping
+
+import aiogram.types
+from aiogram.types import TelegramObject, User
+
+DEFAULT_LOCALE = "en"
+
+_TEXTS = {
+    "en": {
+        "button_create_ticket": "📝 Create Support Ticket",
+        "button_help": "ℹ️ Help",
+        "button_cancel": "❌ Cancel",
+        "button_skip": "⏭ Skip",
+        "start_new": (
+            "Hello, {first_name}! 👋\n\n"
+            "Welcome to the Support Bot!\n"
+            "You've been successfully registered.\n\n"
+            "Use the menu below to create a support ticket or get help."
+        ),
+        "start_returning": (
+            "Welcome back, {first_name}! 👋\n\n"
+            "I'm here to help you with support tickets."
+        ),
+        "help": (
+            "🤖 <b>Support Bot Help</b>\n\n"
+            "<b>Available Commands:</b>\n"
+            "/start - Register and start the bot\n"
+            "/help - Show this help message\n"
+            "/ticket - Create a new support ticket\n\n"
+            "<b>Features:</b>\n"
+            "📝 Create support tickets\n"
+            "💬 Provide detailed descriptions\n"
+            "📧 Add your contact information\n\n"
+            "Use the menu buttons for easy navigation!"
+        ),
+        "ticket_subject_prompt": (
+            "📝 <b>Create Support Ticket</b>\n\n"
+            "Please enter the subject of your ticket:"
+        ),
+        "ticket_description_prompt": "📄 Please provide a detailed description of your issue:",
+        "ticket_contact_prompt": (
+            "📧 Please provide your contact information (email or phone):\n\n"
+            "You can also skip this step if you prefer."
+        ),
+        "ticket_cancelled": "❌ Ticket creation cancelled.",
+        "admin_panel": (
+            "🔐 <b>Admin Panel</b>\n\n"
+            "<b>Available Commands:</b>\n"
+            "/broadcast - Send a message to all users\n"
+            "/broadcasts - List recent broadcasts\n"
+            "/pause_broadcast, /resume_broadcast, /cancel_broadcast &lt;id&gt; - Control a broadcast\n"
+            "/stats - View bot statistics\n"
+            "/tickets [status] - Work the support ticket queue\n"
+            "/search &lt;text&gt; - Search tickets by subject and description\n"
+        ),
+    },
+    "ru": {
+        "button_create_ticket": "📝 Создать обращение",
+        "button_help": "ℹ️ Помощь",
+        "button_cancel": "❌ Отмена",
+        "button_skip": "⏭ Пропустить",
+        "start_new": (
+            "Здравствуйте, {first_name}! 👋\n\n"
+            "Добро пожаловать в бот поддержки!\n"
+            "Вы успешно зарегистрированы.\n\n"
+            "Используйте меню ниже, чтобы создать обращение или получить помощь."
+        ),
+        "start_returning": (
+            "С возвращением, {first_name}! 👋\n\n"
+            "Я помогу вам с обращениями в поддержку."
+        ),
+        "help": (
+            "🤖 <b>Справка по боту поддержки</b>\n\n"
+            "<b>Доступные команды:</b>\n"
+            "/start - Регистрация и запуск бота\n"
+            "/help - Показать эту справку\n"
+            "/ticket - Создать новое обращение\n\n"
+            "<b>Возможности:</b>\n"
+            "📝 Создание обращений в поддержку\n"
+            "💬 Подробное описание проблемы\n"
+            "📧 Контактные данные для связи\n\n"
+            "Используйте кнопки меню для удобной навигации!"
+        ),
+        "ticket_subject_prompt": (
+            "📝 <b>Новое обращение</b>\n\n"
+            "Введите тему обращения:"
+        ),
+        "ticket_description_prompt": "📄 Подробно опишите вашу проблему:",
+        "ticket_contact_prompt": (
+            "📧 Укажите контактные данные (email или телефон):\n\n"
+            "Этот шаг можно пропустить."
+        ),
+        "ticket_cancelled": "❌ Создание обращения отменено.",
+    },
+}
+
+# Every locale falls back to the default one for missing entries, and is read-only
+TEXTS: Mapping[str, Mapping[str, str]] = MappingProxyType({
+    locale: MappingProxyType({**_TEXTS[DEFAULT_LOCALE], **texts})
+    for locale, texts in _TEXTS.items()
+})
+
+# id(markup) -> (markup, reply_markup JSON); holding the markup keeps its id from being reused
+_serialized: dict[int, tuple[TelegramObject, str]] = {}
+# Telegram type -> its frozen subclass
+_frozen_types: dict[type, type] = {}
+
+
+def resolve_locale(user: User | None) -> str:
+    """Pick the supported locale closest to the user's Telegram language"""
+    language = (user.language_code or "") if user else ""
+    locale = language.split("-")[0].lower()
+    return locale if locale in TEXTS else DEFAULT_LOCALE
+
+
+def get_text(name: str, locale: str = DEFAULT_LOCALE) -> str:
+    """Pre-rendered template in the given locale"""
+    return TEXTS.get(locale, TEXTS[DEFAULT_LOCALE])[name]
+
+
+def variants(name: str) -> frozenset[str]:
+    """A template in every locale, e.g. to match a button press in any language"""
+    return frozenset(texts[name] for texts in TEXTS.values())
+
+
+def _drop_none(value):
+    if isinstance(value, dict):
+        return {key: _drop_none(item) for key, item in value.items() if item is not None}
+    if isinstance(value, list):
+        return [_drop_none(item) for item in value]
+    return value
+
+
+class _FrozenList(list):
+    """List that can't be changed, for the rows and buttons of a frozen markup"""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Frozen markups are shared and can't be changed; build a new one instead")
+
+    append = extend = insert = remove = pop = clear = sort = reverse = _read_only
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+
+
+def _frozen_type(cls: type) -> type:
+    if cls not in _frozen_types:
+        frozen = type(cls.__name__, (cls,), {
+            "__module__": cls.__module__,
+            "model_config": {**cls.model_config, "frozen": True},
+        })
+        frozen.model_rebuild(_types_namespace=vars(aiogram.types))
+        _frozen_types[cls] = frozen
+    return _frozen_types[cls]
+
+
+def _deep_freeze(value):
+    if isinstance(value, TelegramObject):
+        fields = {name: _deep_freeze(getattr(value, name)) for name in type(value).model_fields}
+        return _frozen_type(type(value)).model_construct(_fields_set=value.model_fields_set, **fields)
+    if isinstance(value, list):
+        return _FrozenList(_deep_freeze(item) for item in value)
+    return value
+
+
+def freeze_markup(markup: TelegramObject) -> TelegramObject:
+    """Immutable copy of a long-lived markup, serialized once so requests can reuse the JSON"""
+    frozen = _deep_freeze(markup)
+    _serialized[id(frozen)] = (frozen, json.dumps(_drop_none(frozen.model_dump(warnings=False))))
+    return frozen
+
+
+def serialized_markup(markup: TelegramObject) -> str | None:
+    """JSON of a markup returned by freeze_markup(), or None"""
+    entry = _serialized.get(id(markup))
+    return entry[1] if entry is not None and entry[0] is markup else None
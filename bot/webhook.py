@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import signal
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from config import WebhookConfig
+
+logger = logging.getLogger(__name__)
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """Webhook handler that can stop taking updates and wait for in-flight ones"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.draining = False
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.draining:
+            # Telegram retries the update, and another replica picks it up
+            return web.json_response({"ok": False, "error": "shutting down"}, status=503)
+        return await super().handle(request)
+
+    async def drain(self, timeout: float):
+        """Reject new updates and wait for the ones being processed"""
+        self.draining = True
+        tasks = list(self._background_feed_update_tasks)
+        if not tasks:
+            return
+        logger.info(f"Draining {len(tasks)} in-flight update(s)...")
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            logger.warning(f"{len(pending)} update(s) still running after {timeout}s drain timeout")
+
+
+def create_app(dp: Dispatcher, bot: Bot, config: WebhookConfig) -> web.Application:
+    """Build the aiohttp application serving the webhook and health endpoints"""
+    app = web.Application()
+    handler = DrainingRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=config.secret,
+        handle_in_background=True
+    )
+
+    async def health(request: web.Request) -> web.Response:
+        status = 503 if handler.draining else 200
+        return web.json_response(
+            {"status": "draining" if handler.draining else "ok", "in_flight": handler.in_flight},
+            status=status
+        )
+
+    async def drain(app: web.Application):
+        await handler.drain(config.drain_timeout)
+
+    app.router.add_get("/healthz", health)
+    # Must run before the handler's own shutdown hook closes the bot session
+    app.on_shutdown.append(drain)
+    handler.register(app, path=config.path)
+    setup_application(app, dp, bot=bot)
+    app["webhook_handler"] = handler
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, config: WebhookConfig):
+    """Serve updates over a webhook until SIGINT/SIGTERM, then drain gracefully"""
+    app = create_app(dp, bot, config)
+    if config.set_on_startup:
+        await bot.set_webhook(
+            url=config.url.rstrip("/") + config.path,
+            secret_token=config.secret,
+            allowed_updates=dp.resolve_used_update_types()
+        )
+        logger.info(f"Webhook set to {config.url}{config.path}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    runner = web.AppRunner(app, shutdown_timeout=config.drain_timeout)
+    await runner.setup()
+    site = web.TCPSite(runner, config.host, config.port)
+    await site.start()
+    logger.info(f"Webhook server listening on {config.host}:{config.port}")
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Shutting down webhook server...")
+        await runner.cleanup()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
@@ -0,0 +1,262 @@
+import asyncio
+import json
+import logging
+import signal
+import sys
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramServerError
+from aiohttp import web
+
+from config import WebhookConfig
+
+logger = logging.getLogger(__name__)
+
+MAIN_SCRIPT = Path(__file__).resolve().parent.parent / "main.py"
+# Nested update fields that identify who caused the update, in order of preference
+SHARD_FIELDS = ("from", "user", "chat")
+RESTART_DELAY = 1.0
+_RESTART = object()
+
+
+def shard_key(update: dict) -> int:
+    """ID of the user an update belongs to, falling back to the chat"""
+    for name, event in update.items():
+        if name == "update_id" or not isinstance(event, dict):
+            continue
+        for field in SHARD_FIELDS:
+            value = event.get(field)
+            if isinstance(value, dict) and "id" in value:
+                return value["id"]
+        return 0
+    return 0
+
+
+class WorkerProcess:
+    """One worker process fed with newline-delimited JSON updates over stdin"""
+
+    def __init__(self, index: int, count: int, queue_size: int):
+        self.index = index
+        self.count = count
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.process: asyncio.subprocess.Process | None = None
+        self._task: asyncio.Task | None = None
+
+    async def _spawn(self):
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, str(MAIN_SCRIPT), "--worker", str(self.index), "--workers", str(self.count),
+            stdin=asyncio.subprocess.PIPE
+        )
+        logger.info(f"Worker {self.index} started (pid {self.process.pid})")
+
+    async def _stop_process(self):
+        """Close stdin and wait for the worker to finish what it has already received"""
+        if self.process is None:
+            return
+        if self.process.returncode is None:
+            self.process.stdin.close()
+            await self.process.wait()
+        logger.info(f"Worker {self.index} exited with code {self.process.returncode}")
+        self.process = None
+
+    async def _write(self, line: bytes):
+        while True:
+            if self.process is None or self.process.returncode is not None:
+                if self.process is not None:
+                    logger.error(f"Worker {self.index} died with code {self.process.returncode}, restarting")
+                    await asyncio.sleep(RESTART_DELAY)
+                await self._spawn()
+            try:
+                self.process.stdin.write(line)
+                await self.process.stdin.drain()
+                return
+            except (BrokenPipeError, ConnectionResetError):
+                await self.process.wait()
+
+    async def _run(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                if item is None:
+                    await self._stop_process()
+                    return
+                if item is _RESTART:
+                    await self._stop_process()
+                    await self._spawn()
+                    continue
+                await self._write(item)
+            finally:
+                self.queue.task_done()
+
+    async def start(self):
+        await self._spawn()
+        self._task = asyncio.create_task(self._run())
+
+    async def join(self):
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+
+class WorkerPool:
+    """Fans updates out to `count` worker processes, sharded by user ID.
+
+    All updates of one user go to the same worker, in order, so FSM steps
+    are never reordered. Each worker is a separate `main.py --worker`
+    process with its own event loop, bot session and database pool. A
+    worker that dies is restarted; updates for its shard wait in its queue
+    meanwhile. restart() replaces workers one at a time, each after it has
+    finished the updates it already received.
+    """
+
+    def __init__(self, count: int, queue_size: int = 1000):
+        self.count = count
+        self.workers = [WorkerProcess(index, count, queue_size) for index in range(count)]
+
+    async def start(self):
+        for worker in self.workers:
+            await worker.start()
+
+    async def dispatch(self, update: dict):
+        """Queue a raw update for the worker owning its user"""
+        worker = self.workers[shard_key(update) % self.count]
+        await worker.queue.put(json.dumps(update, separators=(",", ":")).encode() + b"\n")
+
+    async def restart(self):
+        """Rolling restart, e.g. after a deploy"""
+        for worker in self.workers:
+            await worker.queue.put(_RESTART)
+            await worker.queue.join()
+
+    async def close(self):
+        """Deliver everything queued, then stop all workers"""
+        for worker in self.workers:
+            await worker.queue.put(None)
+        await asyncio.gather(*(worker.join() for worker in self.workers))
+
+
+async def run_worker_loop(
+    feed: Callable[[dict], Awaitable[Any]],
+    index: int,
+    count: int,
+    concurrency: int = 100
+):
+    """Read updates from stdin and feed them, keeping each user's updates in order"""
+    loop = asyncio.get_running_loop()
+    # Shutdown is driven by the ingress closing stdin
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: None)
+
+    reader = asyncio.StreamReader(limit=2 ** 22)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    semaphore = asyncio.Semaphore(concurrency)
+    # user -> task processing that user's latest update
+    tails: dict[int, asyncio.Task] = {}
+
+    async def process(update: dict, previous: asyncio.Task | None):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        async with semaphore:
+            try:
+                await feed(update)
+            except Exception:
+                logger.exception(f"Worker {index} failed to process update {update.get('update_id')}")
+
+    def forget(key: int, task: asyncio.Task):
+        if tails.get(key) is task:
+            del tails[key]
+
+    logger.info(f"Worker {index}/{count} ready")
+    while line := await reader.readline():
+        update = json.loads(line)
+        key = shard_key(update)
+        task = asyncio.create_task(process(update, tails.get(key)))
+        tails[key] = task
+        task.add_done_callback(lambda t, key=key: forget(key, t))
+    if tails:
+        await asyncio.gather(*tails.values(), return_exceptions=True)
+    logger.info(f"Worker {index} drained, stopping")
+
+
+async def poll_into(pool: WorkerPool, bot: Bot, allowed_updates: list[str]):
+    """Long-poll getUpdates and hand every update to the pool until cancelled"""
+    offset = None
+    try:
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=allowed_updates)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.warning(f"getUpdates failed: {e}")
+                await asyncio.sleep(RESTART_DELAY)
+                continue
+            for update in updates:
+                await pool.dispatch(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+                offset = update.update_id + 1
+    except asyncio.CancelledError:
+        if offset is not None:
+            # Confirm what was dispatched so it isn't delivered again after a restart
+            await bot.get_updates(offset=offset, timeout=0, limit=1)
+        raise
+
+
+def create_ingress_app(pool: WorkerPool, config: WebhookConfig) -> web.Application:
+    """Webhook application that forwards raw updates to the pool"""
+    app = web.Application()
+
+    async def receive(request: web.Request) -> web.Response:
+        if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != config.secret:
+            return web.Response(status=401)
+        await pool.dispatch(await request.json())
+        return web.json_response({})
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "workers": pool.count})
+
+    app.router.add_post(config.path, receive)
+    app.router.add_get("/healthz", health)
+    return app
+
+
+async def run_ingress(
+    pool: WorkerPool,
+    bot: Bot,
+    run_mode: str,
+    webhook: WebhookConfig,
+    allowed_updates: list[str]
+):
+    """Receive updates until SIGINT/SIGTERM; SIGHUP restarts the workers one by one"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(pool.restart()))
+
+    await pool.start()
+    runner = None
+    try:
+        if run_mode == "webhook":
+            runner = web.AppRunner(create_ingress_app(pool, webhook), shutdown_timeout=webhook.drain_timeout)
+            await runner.setup()
+            await web.TCPSite(runner, webhook.host, webhook.port).start()
+            if webhook.set_on_startup:
+                await bot.set_webhook(
+                    url=webhook.url.rstrip("/") + webhook.path,
+                    secret_token=webhook.secret,
+                    allowed_updates=allowed_updates
+                )
+            logger.info(f"Webhook ingress listening on {webhook.host}:{webhook.port}")
+            await stop.wait()
+        else:
+            polling = asyncio.create_task(poll_into(pool, bot, allowed_updates))
+            await stop.wait()
+            polling.cancel()
+            await asyncio.gather(polling, return_exceptions=True)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+        logger.info("Stopping workers...")
+        await pool.close()
+        for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+            loop.remove_signal_handler(sig)
@@ -2,20 +2,128 @@ import os
 from dataclasses import dataclass
 from dotenv import load_dotenv
 
-load_dotenv()
-
 
 @dataclass
 class BotConfig:
     """Bot configuration"""
     token: str
     admin_ids: list[int]
+    # "polling" or "webhook"
+    run_mode: str = "polling"
+    # Custom Bot API server, e.g. a local fake server for testing
+    api_url: str | None = None
+    # Worker processes handling updates; 0 handles them in the main process
+    workers: int = 0
+    # Log how long each startup phase took
+    startup_profile: bool = False
+
+
+@dataclass
+class WebhookConfig:
+    """Webhook server configuration"""
+    url: str = ""
+    path: str = "/webhook"
+    secret: str = ""
+    host: str = "0.0.0.0"
+    port: int = 8080
+    drain_timeout: float = 30.0
+    set_on_startup: bool = True
 
 
 @dataclass
 class DatabaseConfig:
     """Database configuration"""
     url: str
+    pool_size: int = 10
+    max_overflow: int = 20
+    pool_timeout: float = 30.0
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+    statement_cache_size: int = 100
+    statement_timeout: int = 0
+    # Attempts to reach the database on startup, with exponential backoff in between
+    connect_retries: int = 8
+    # Connections opened before the first update arrives
+    pool_warmup: int = 4
+
+
+@dataclass
+class BroadcastConfig:
+    """Broadcast delivery configuration"""
+    rate_limit: float = 30
+    workers: int = 20
+    progress_interval: float = 5.0
+    # Another process takes over a job whose owner hasn't renewed its claim for this long
+    lease_duration: float = 60.0
+
+
+@dataclass
+class FSMConfig:
+    """FSM storage configuration"""
+    # "database", "redis" or "memory"
+    backend: str = "database"
+    redis_url: str = "redis://localhost:6379/0"
+    ttl: float = 86400
+    flush_interval: float = 0.1
+    # Database backend: seconds reads are served from memory; 0 when several processes serve one user
+    cache_ttl: float = 60
+
+
+@dataclass
+class ThrottlingConfig:
+    """Per-user flood protection configuration"""
+    limit: int = 10
+    per: float = 10.0
+    cooldown: float = 60.0
+    strikes: int = 5
+
+
+@dataclass
+class TicketConfig:
+    """Ticket creation configuration"""
+    write_behind: bool = False
+    batch_size: int = 100
+    flush_interval: float = 0.5
+    # Group or supergroup where new tickets are posted and answered
+    support_chat_id: int | None = None
+    # Seconds a ticket stays in the duplicate detector, 0 disables it
+    duplicate_window: float = 3600
+    duplicate_threshold: float = 0.6
+
+
+@dataclass
+class ArchiveConfig:
+    """Archival of old closed tickets"""
+    # Closed tickets created more than this many days ago are archived, 0 disables archival
+    after_days: int = 0
+    # Gzipped JSON Lines files are written here
+    directory: str = "archive"
+    chunk_size: int = 1000
+    interval: float = 3600
+
+
+@dataclass
+class SLAConfig:
+    """Ticket follow-up, escalation and auto-close deadlines, in seconds; 0 disables each"""
+    # Remind the user that their unresolved ticket is being worked on, repeated at this interval
+    follow_up_after: float = 0
+    # Alert the admins about tickets nobody has claimed this long after creation
+    escalate_after: float = 0
+    # Close resolved tickets this long after they were resolved
+    auto_close_after: float = 0
+    # Due deadlines handled per transaction
+    batch_size: int = 500
+    # Deadlines this far ahead are kept in memory
+    lookahead: float = 300
+
+
+@dataclass
+class MetricsConfig:
+    """Prometheus metrics endpoint configuration"""
+    enabled: bool = True
+    # Served on its own port in every mode; only local by default, as it isn't authenticated
+    host: str = "127.0.0.1"
+    port: int = 9090
 
 
 @dataclass
@@ -23,10 +131,19 @@ class Config:
     """Main configuration"""
     bot: BotConfig
     db: DatabaseConfig
+    broadcast: BroadcastConfig
+    webhook: WebhookConfig
+    fsm: FSMConfig
+    throttling: ThrottlingConfig
+    tickets: TicketConfig
+    metrics: MetricsConfig
+    archive: ArchiveConfig
+    sla: SLAConfig
 
 
 def load_config() -> Config:
-    """Load configuration from environment variables"""
+    """Load configuration from environment variables (and .env, if present)"""
+    load_dotenv()
     bot_token = os.getenv("BOT_TOKEN")
     if not bot_token:
         raise ValueError("BOT_TOKEN environment variable is not set")
@@ -34,11 +151,123 @@ def load_config() -> Config:
     admin_ids_str = os.getenv("ADMIN_IDS", "")
     admin_ids = [int(id.strip()) for id in admin_ids_str.split(",") if id.strip()]
     
+    run_mode = os.getenv("RUN_MODE", "polling").lower()
+    if run_mode not in ("polling", "webhook"):
+        raise ValueError("RUN_MODE must be either 'polling' or 'webhook'")
+    
+    webhook = WebhookConfig(
+        url=os.getenv("WEBHOOK_URL", ""),
+        path=os.getenv("WEBHOOK_PATH", "/webhook"),
+        secret=os.getenv("WEBHOOK_SECRET", ""),
+        host=os.getenv("WEBHOOK_HOST", "0.0.0.0"),
+        port=int(os.getenv("WEBHOOK_PORT", "8080")),
+        drain_timeout=float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30")),
+        set_on_startup=os.getenv("WEBHOOK_SET_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+    )
+    if run_mode == "webhook" and not webhook.secret:
+        raise ValueError("WEBHOOK_SECRET environment variable is required in webhook mode")
+    if run_mode == "webhook" and webhook.set_on_startup and not webhook.url:
+        raise ValueError("WEBHOOK_URL environment variable is required in webhook mode")
+    
     database_url = os.getenv("DATABASE_URL")
     if not database_url:
         raise ValueError("DATABASE_URL environment variable is not set")
     
+    db = DatabaseConfig(
+        url=database_url,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+        statement_cache_size=int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100")),
+        statement_timeout=int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0")),
+        connect_retries=int(os.getenv("DB_CONNECT_RETRIES", "8")),
+        pool_warmup=int(os.getenv("DB_POOL_WARMUP", "4"))
+    )
+    if db.connect_retries < 1:
+        raise ValueError("DB_CONNECT_RETRIES must be at least 1")
+    
+    broadcast = BroadcastConfig(
+        rate_limit=float(os.getenv("BROADCAST_RATE_LIMIT", "30")),
+        workers=int(os.getenv("BROADCAST_WORKERS", "20")),
+        progress_interval=float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "5")),
+        lease_duration=float(os.getenv("BROADCAST_LEASE_DURATION", "60"))
+    )
+    if not 0 < broadcast.progress_interval < broadcast.lease_duration:
+        raise ValueError("BROADCAST_PROGRESS_INTERVAL must be > 0 and shorter than BROADCAST_LEASE_DURATION")
+    
+    fsm = FSMConfig(
+        backend=os.getenv("FSM_STORAGE", "database").lower(),
+        redis_url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+        ttl=float(os.getenv("FSM_TTL", "86400")),
+        flush_interval=float(os.getenv("FSM_FLUSH_INTERVAL", "0.1")),
+        cache_ttl=float(os.getenv("FSM_CACHE_TTL", "60"))
+    )
+    if fsm.backend not in ("database", "redis", "memory"):
+        raise ValueError("FSM_STORAGE must be one of 'database', 'redis' or 'memory'")
+    
+    throttling = ThrottlingConfig(
+        limit=int(os.getenv("THROTTLE_LIMIT", "10")),
+        per=float(os.getenv("THROTTLE_PER", "10")),
+        cooldown=float(os.getenv("THROTTLE_COOLDOWN", "60")),
+        strikes=int(os.getenv("THROTTLE_STRIKES", "5"))
+    )
+    
+    tickets = TicketConfig(
+        write_behind=os.getenv("TICKET_WRITE_BEHIND", "false").lower() in ("1", "true", "yes"),
+        batch_size=int(os.getenv("TICKET_BATCH_SIZE", "100")),
+        flush_interval=float(os.getenv("TICKET_FLUSH_INTERVAL", "0.5")),
+        support_chat_id=int(os.getenv("SUPPORT_CHAT_ID")) if os.getenv("SUPPORT_CHAT_ID") else None,
+        duplicate_window=float(os.getenv("DUPLICATE_WINDOW", "3600")),
+        duplicate_threshold=float(os.getenv("DUPLICATE_THRESHOLD", "0.6"))
+    )
+    if not 0 < tickets.duplicate_threshold <= 1:
+        raise ValueError("DUPLICATE_THRESHOLD must be between 0 and 1")
+    
+    archive = ArchiveConfig(
+        after_days=int(os.getenv("ARCHIVE_AFTER_DAYS", "0")),
+        directory=os.getenv("ARCHIVE_DIR", "archive"),
+        chunk_size=int(os.getenv("ARCHIVE_CHUNK_SIZE", "1000")),
+        interval=float(os.getenv("ARCHIVE_INTERVAL", "3600"))
+    )
+    if archive.after_days < 0 or archive.chunk_size < 1:
+        raise ValueError("ARCHIVE_AFTER_DAYS must be >= 0 and ARCHIVE_CHUNK_SIZE >= 1")
+    
+    sla = SLAConfig(
+        follow_up_after=float(os.getenv("SLA_FOLLOW_UP_AFTER", "0")),
+        escalate_after=float(os.getenv("SLA_ESCALATE_AFTER", "0")),
+        auto_close_after=float(os.getenv("SLA_AUTO_CLOSE_AFTER", "0")),
+        batch_size=int(os.getenv("SLA_BATCH_SIZE", "500")),
+        lookahead=float(os.getenv("SLA_LOOKAHEAD", "300"))
+    )
+    if min(sla.follow_up_after, sla.escalate_after, sla.auto_close_after) < 0:
+        raise ValueError("SLA_FOLLOW_UP_AFTER, SLA_ESCALATE_AFTER and SLA_AUTO_CLOSE_AFTER must be >= 0")
+    if sla.batch_size < 1 or sla.lookahead <= 0:
+        raise ValueError("SLA_BATCH_SIZE must be >= 1 and SLA_LOOKAHEAD > 0")
+    
+    metrics = MetricsConfig(
+        enabled=os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes"),
+        host=os.getenv("METRICS_HOST", "127.0.0.1"),
+        port=int(os.getenv("METRICS_PORT", "9090"))
+    )
+    
     return Config(
-        bot=BotConfig(token=bot_token, admin_ids=admin_ids),
-        db=DatabaseConfig(url=database_url)
+        bot=BotConfig(
+            token=bot_token,
+            admin_ids=admin_ids,
+            run_mode=run_mode,
+            api_url=os.getenv("TELEGRAM_API_URL") or None,
+            workers=int(os.getenv("WORKERS", "0")),
+            startup_profile=os.getenv("STARTUP_PROFILE", "false").lower() in ("1", "true", "yes")
+        ),
+        db=db,
+        broadcast=broadcast,
+        webhook=webhook,
+        fsm=fsm,
+        throttling=throttling,
+        tickets=tickets,
+        metrics=metrics,
+        archive=archive,
+        sla=sla
     )
@@ -1,4 +1,4 @@
 from database.database import Database
-from database.models import User, SupportTicket
+from database.models import User, SupportTicket, BroadcastJob, BroadcastDelivery, TicketMessage, TicketDeadline
 
-__all__ = ["Database", "User", "SupportTicket"]
+__all__ = ["Database", "User", "SupportTicket", "BroadcastJob", "BroadcastDelivery", "TicketMessage", "TicketDeadline"]
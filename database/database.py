@@ -1,18 +1,153 @@
+import re
+import time
+from pathlib import Path
+from typing import Callable
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, make_url
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from config import DatabaseConfig
 from database.models import Base
 
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+VERSIONS_DIR = ALEMBIC_INI.parent / "migrations" / "versions"
+_REVISION_LINE = re.compile(r"^(revision|down_revision)\b[^=]*=\s*(.+)$", re.MULTILINE)
+
+
+def head_revisions() -> set[str]:
+    """Head revisions of the migration scripts, read without importing Alembic"""
+    revisions, parents = set(), set()
+    for script in VERSIONS_DIR.glob("*.py"):
+        for name, value in _REVISION_LINE.findall(script.read_text(encoding="utf-8")):
+            ids = set(re.findall(r"[\"']([^\"']+)[\"']", value))
+            (revisions if name == "revision" else parents).update(ids)
+    return revisions - parents
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that reports how long each checkout waited for a connection"""
+
+    on_wait: Callable[[float], None] | None = None
+
+    def _do_get(self):
+        if self.on_wait is None:
+            return super()._do_get()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.on_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.on_wait = self.on_wait
+        return pool
+
 
 class Database:
-    def __init__(self, database_url: str):
-        self.engine = create_async_engine(database_url, echo=False)
+    def __init__(
+        self,
+        database_url: str,
+        pool_size: int = 10,
+        max_overflow: int = 20,
+        pool_timeout: float = 30.0,
+        pool_recycle: int = 1800,
+        pool_pre_ping: bool = True,
+        statement_cache_size: int = 100,
+        statement_timeout: int = 0
+    ):
+        engine_options = {}
+        connect_args = {}
+        url = make_url(database_url)
+        if url.get_backend_name() == "postgresql":
+            engine_options.update(
+                poolclass=TimedQueuePool,
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_timeout=pool_timeout,
+                pool_recycle=pool_recycle,
+                pool_pre_ping=pool_pre_ping
+            )
+            if url.get_driver_name() == "asyncpg":
+                connect_args["statement_cache_size"] = statement_cache_size
+                if statement_timeout:
+                    # Milliseconds; enforced by the server for every statement
+                    connect_args["server_settings"] = {"statement_timeout": str(statement_timeout)}
+        self.engine = create_async_engine(
+            database_url,
+            echo=False,
+            connect_args=connect_args,
+            **engine_options
+        )
         self.session_maker = async_sessionmaker(
             self.engine,
             class_=AsyncSession,
             expire_on_commit=False
         )
 
+    @classmethod
+    def from_config(cls, config: DatabaseConfig) -> "Database":
+        """Create a Database with the pool settings from the configuration"""
+        return cls(
+            config.url,
+            pool_size=config.pool_size,
+            max_overflow=config.max_overflow,
+            pool_timeout=config.pool_timeout,
+            pool_recycle=config.pool_recycle,
+            pool_pre_ping=config.pool_pre_ping,
+            statement_cache_size=config.statement_cache_size,
+            statement_timeout=config.statement_timeout
+        )
+
+    def pool_status(self) -> dict[str, float]:
+        """Current connection pool utilisation"""
+        pool = self.engine.pool
+        if not isinstance(pool, QueuePool):
+            return {}
+        capacity = pool.size() + pool._max_overflow
+        checked_out = pool.checkedout()
+        return {
+            "size": pool.size(),
+            "capacity": capacity,
+            "checked_out": checked_out,
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "utilisation": checked_out / capacity if capacity > 0 else 0.0,
+        }
+
+    async def run_migrations(self) -> bool:
+        """Upgrade the database schema to the latest Alembic revision.
+
+        Returns False without touching Alembic if the schema is already up to date.
+        """
+        async with self.engine.connect() as conn:
+            current = await conn.run_sync(self._current_revisions)
+        if current == head_revisions():
+            return False
+        async with self.engine.begin() as conn:
+            await conn.run_sync(self._upgrade)
+        return True
+
+    @staticmethod
+    def _current_revisions(connection: Connection) -> set[str]:
+        if not inspect(connection).has_table("alembic_version"):
+            return set()
+        return set(connection.execute(text("SELECT version_num FROM alembic_version")).scalars())
+
+    @staticmethod
+    def _upgrade(connection: Connection):
+        # Alembic takes a while to import and is only needed when there is something to migrate
+        from alembic import command
+        from alembic.config import Config as AlembicConfig
+
+        alembic_config = AlembicConfig(str(ALEMBIC_INI))
+        alembic_config.attributes["connection"] = connection
+        command.upgrade(alembic_config, "head")
+
     async def create_tables(self):
-        """Create all tables in the database"""
+        """Create all tables in the database without migrations (for local tests)"""
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
 
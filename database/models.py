@@ -1,37 +1,140 @@
 from datetime import datetime
-from sqlalchemy import BigInteger, String, DateTime, Text, Boolean
+from sqlalchemy import BigInteger, Integer, String, DateTime, Text, Boolean, JSON, Index, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
+# SQLite only auto-increments INTEGER primary keys
+BigIntegerPK = BigInteger().with_variant(Integer, "sqlite")
+
+
 class Base(DeclarativeBase):
     pass
 
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Keyset scan of active users for broadcasts
+        Index("ix_users_active_telegram_id", "is_active", "telegram_id"),
+    )
 
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    id: Mapped[int] = mapped_column(BigIntegerPK, primary_key=True)
     telegram_id: Mapped[int] = mapped_column(BigInteger, unique=True, nullable=False)
     username: Mapped[str] = mapped_column(String(255), nullable=True)
     first_name: Mapped[str] = mapped_column(String(255), nullable=True)
     last_name: Mapped[str] = mapped_column(String(255), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # Polled by other processes to drop the user from their caches
+    deactivated_at: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)
 
     def __repr__(self):
         return f"<User(telegram_id={self.telegram_id}, username={self.username})>"
 
 
 class SupportTicket(Base):
+    # On PostgreSQL the table is partitioned by month on created_at with the
+    # primary key (id, created_at), see migration 0008; `id` alone stays unique
     __tablename__ = "support_tickets"
+    __table_args__ = (
+        Index("ix_support_tickets_user_created", "user_id", "created_at"),
+        Index("ix_support_tickets_status_created", "status", "created_at", "id"),
+        Index(
+            "ix_support_tickets_open",
+            "created_at",
+            "id",
+            postgresql_where=text("status = 'open'"),
+            sqlite_where=text("status = 'open'")
+        ),
+    )
 
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    id: Mapped[int] = mapped_column(BigIntegerPK, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     subject: Mapped[str] = mapped_column(String(255), nullable=False)
     description: Mapped[str] = mapped_column(Text, nullable=False)
     contact_info: Mapped[str] = mapped_column(String(255), nullable=True)
+    # open -> in_progress -> resolved -> closed
     status: Mapped[str] = mapped_column(String(50), default="open")
+    assigned_to: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    # First ticket of a group of near-identical reports
+    duplicate_of: Mapped[int] = mapped_column(BigInteger, nullable=True, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
 
     def __repr__(self):
         return f"<SupportTicket(id={self.id}, user_id={self.user_id}, subject={self.subject})>"
+
+
+class BroadcastJob(Base):
+    __tablename__ = "broadcast_jobs"
+
+    id: Mapped[int] = mapped_column(BigIntegerPK, primary_key=True, autoincrement=True)
+    admin_chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    status_message_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+    status: Mapped[str] = mapped_column(String(20), default="queued")
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    sent: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    # Every active user with telegram_id <= last_telegram_id has been processed
+    last_telegram_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    # Process delivering the job, and until when its claim holds; renewed at every checkpoint
+    owner: Mapped[str] = mapped_column(String(100), nullable=True)
+    lease_until: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    # "paused" or "cancelled", requested from a process that doesn't deliver the job
+    stop_requested: Mapped[str] = mapped_column(String(20), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<BroadcastJob(id={self.id}, status={self.status}, sent={self.sent}/{self.total})>"
+
+
+class BroadcastDelivery(Base):
+    __tablename__ = "broadcast_deliveries"
+
+    job_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    telegram_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    status: Mapped[str] = mapped_column(String(20), nullable=False)
+
+    def __repr__(self):
+        return f"<BroadcastDelivery(job_id={self.job_id}, telegram_id={self.telegram_id}, status={self.status})>"
+
+
+class FSMRecord(Base):
+    __tablename__ = "fsm_states"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    state: Mapped[str] = mapped_column(String(255), nullable=True)
+    data: Mapped[dict] = mapped_column(JSON, nullable=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<FSMRecord(key={self.key}, state={self.state})>"
+
+
+class TicketMessage(Base):
+    """Maps a relayed message to its ticket; `peer_message_id` is its counterpart on the other side"""
+    __tablename__ = "ticket_messages"
+
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    message_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    ticket_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    peer_message_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
+
+    def __repr__(self):
+        return f"<TicketMessage(chat_id={self.chat_id}, message_id={self.message_id}, ticket_id={self.ticket_id})>"
+
+
+class TicketDeadline(Base):
+    """A pending SLA action for a ticket, handled by bot/services/sla.py"""
+    __tablename__ = "ticket_deadlines"
+
+    ticket_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    # "follow_up", "escalate" or "auto_close"
+    kind: Mapped[str] = mapped_column(String(20), primary_key=True)
+    due_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<TicketDeadline(ticket_id={self.ticket_id}, kind={self.kind}, due_at={self.due_at})>"
@@ -1,14 +1,44 @@
+import time
+
+# Origin of the startup profile, taken before the (slow) imports below
+STARTED = time.perf_counter()
+
+import argparse
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher
+from typing import Callable
+
+from aiogram import Bot, Dispatcher, Router
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import load_config
+from config import Config, load_config
 from database import Database
-from bot.handlers import basic, support, admin
+from bot.fsm_storage import create_storage
 from bot.middlewares.database import DatabaseMiddleware, AdminMiddleware
+from bot.middlewares.throttling import ThrottlingMiddleware
+from bot.session import PreparedMarkupSession
+from bot.metrics import (
+    HandlerMetricsMiddleware,
+    RequestMetricsMiddleware,
+    UpdateCounterMiddleware,
+    instrument_database,
+    start_metrics_server
+)
+from bot.services.archive import TicketArchiver
+from bot.services.broadcast import Broadcaster
+from bot.services.duplicates import DuplicateDetector
+from bot.services.relay import TicketRelay
+from bot.services.search import TicketSearch
+from bot.services.sla import SLAScheduler
+from bot.services.tickets import TicketService
+from bot.services.users import UserCacheSync
+from bot.startup import StartupProfile, load_routers, warm_up
+from bot.webhook import run_webhook
+from bot.workers import WorkerPool, run_ingress, run_worker_loop
+
+IMPORTED = time.perf_counter()
 
 # Configure logging
 logging.basicConfig(
@@ -18,63 +48,273 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    """Main function to start the bot"""
-    # Load configuration
-    config = load_config()
-    logger.info("Configuration loaded")
-    
-    # Initialize database
-    db = Database(config.db.url)
-    
-    # Wait for database to be ready
-    max_retries = 5
-    retry_delay = 5
-    for attempt in range(max_retries):
-        try:
-            await db.create_tables()
-            logger.info("Database tables created")
-            break
-        except Exception as e:
-            if attempt < max_retries - 1:
-                logger.warning(f"Database connection failed (attempt {attempt + 1}/{max_retries}): {e}")
-                logger.info(f"Retrying in {retry_delay} seconds...")
-                await asyncio.sleep(retry_delay)
-            else:
-                logger.error(f"Failed to connect to database after {max_retries} attempts")
-                raise
-    
-    # Initialize bot and dispatcher
+def create_bot(config: Config) -> Bot:
+    """Create the bot, pointed at a custom Bot API server if configured"""
+    # Sends the frozen reply keyboards as pre-serialized JSON
+    session = PreparedMarkupSession()
+    if config.bot.api_url:
+        session = PreparedMarkupSession(api=TelegramAPIServer.from_base(config.bot.api_url))
     bot = Bot(
         token=config.bot.token,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
+    if config.metrics.enabled:
+        bot.session.middleware(RequestMetricsMiddleware())
+    return bot
+
+
+def include_routers(dp: Dispatcher, routers: list[Router] | None = None):
+    """Register routers, importing the handler modules if they aren't loaded yet"""
+    dp.include_routers(*(routers if routers is not None else load_routers()))
+
+
+async def create_dispatcher(
+    config: Config,
+    bot: Bot,
+    db: Database,
+    owns_chat: Callable[[int], bool] | None = None,
+    routers: list[Router] | None = None
+) -> Dispatcher:
+    """Build the dispatcher with its services, middlewares and routers.
     
+    In worker mode `owns_chat` tells which admin chats' broadcasts this
+    process resumes after a restart.
+    """
     # Initialize storage for FSM
-    storage = MemoryStorage()
+    storage = create_storage(config.fsm, db.session_maker)
     dp = Dispatcher(storage=storage)
     
-    # Register middlewares
+    # Background broadcast engine, injected into handlers as `broadcaster`
+    broadcaster = Broadcaster(
+        bot,
+        db.session_maker,
+        rate_limit=config.broadcast.rate_limit,
+        workers=config.broadcast.workers,
+        progress_interval=config.broadcast.progress_interval,
+        lease_duration=config.broadcast.lease_duration
+    )
+    dp["broadcaster"] = broadcaster
+    dp["db"] = db
+    
+    # Ticket follow-ups, escalation and auto-close; safe to run in several processes
+    sla = SLAScheduler(
+        bot,
+        db.session_maker,
+        config.bot.admin_ids,
+        follow_up_after=config.sla.follow_up_after,
+        escalate_after=config.sla.escalate_after,
+        auto_close_after=config.sla.auto_close_after,
+        batch_size=config.sla.batch_size,
+        lookahead=config.sla.lookahead
+    )
+    await sla.start()
+    dp["sla"] = sla
+    
+    # Ticket creation, optionally through the write-behind queue; schedules the SLA deadlines
+    tickets = TicketService(
+        db.session_maker,
+        write_behind=config.tickets.write_behind,
+        batch_size=config.tickets.batch_size,
+        flush_interval=config.tickets.flush_interval,
+        sla=sla
+    )
+    await tickets.start()
+    dp["tickets"] = tickets
+    dp["search"] = TicketSearch()
+    
+    # Near-duplicate detection over recently created tickets
+    duplicates = DuplicateDetector(
+        window=config.tickets.duplicate_window,
+        threshold=config.tickets.duplicate_threshold
+    )
+    await duplicates.start(db.session_maker)
+    dp["duplicates"] = duplicates
+    
+    # Other processes deactivate users during broadcasts; keep the user cache in step
+    user_sync = UserCacheSync(db.session_maker)
+    await user_sync.start()
+    dp["user_sync"] = user_sync
+    
+    # Two-way relay between ticket owners and the support chat
+    ticket_relay = TicketRelay(bot, db.session_maker, support_chat_id=config.tickets.support_chat_id)
+    dp["relay"] = ticket_relay
+    if not ticket_relay.enabled:
+        logger.info("SUPPORT_CHAT_ID is not set, ticket relay disabled")
+    
+    # Partition upkeep and archival of old closed tickets; safe to run in several processes
+    archiver = TicketArchiver(
+        db.session_maker,
+        directory=config.archive.directory,
+        after_days=config.archive.after_days,
+        chunk_size=config.archive.chunk_size,
+        interval=config.archive.interval
+    )
+    await archiver.start()
+    dp["archiver"] = archiver
+    
+    resumed = await broadcaster.resume_unfinished(owns_chat)
+    if resumed:
+        logger.info(f"Resumed {resumed} unfinished broadcast(s)")
+    
+    # Register middlewares; throttling runs first so dropped updates never get a session
+    if config.metrics.enabled:
+        handler_metrics = HandlerMetricsMiddleware()
+        dp.update.outer_middleware(UpdateCounterMiddleware())
+        dp.message.middleware(handler_metrics)
+        dp.callback_query.middleware(handler_metrics)
+    dp.message.middleware(ThrottlingMiddleware(
+        limit=config.throttling.limit,
+        per=config.throttling.per,
+        cooldown=config.throttling.cooldown,
+        strikes=config.throttling.strikes
+    ))
     dp.message.middleware(DatabaseMiddleware(db.session_maker))
     dp.message.middleware(AdminMiddleware(config.bot.admin_ids))
+    dp.callback_query.middleware(DatabaseMiddleware(db.session_maker))
+    dp.callback_query.middleware(AdminMiddleware(config.bot.admin_ids))
+    
+    include_routers(dp, routers)
+    return dp
+
+
+async def close_dispatcher(dp: Dispatcher):
+    """Flush and stop the services started by create_dispatcher()"""
+    await dp["tickets"].close()
+    await dp["relay"].close()
+    await dp["archiver"].close()
+    await dp["sla"].close()
+    await dp["duplicates"].close()
+    await dp["user_sync"].close()
+    await dp["broadcaster"].shutdown()
+
+
+async def main(profile: StartupProfile):
+    """Main function to start the bot"""
+    profile.record("imports", STARTED, IMPORTED)
+    
+    # Load configuration
+    with profile.phase("config"):
+        config = load_config()
+    profile.enabled = profile.enabled or config.bot.startup_profile
+    logger.info("Configuration loaded")
     
-    # Register routers
-    dp.include_router(basic.router)
-    dp.include_router(support.router)
-    dp.include_router(admin.router)
+    db = Database.from_config(config.db)
+    if config.metrics.enabled and config.bot.workers == 0:
+        instrument_database(db)
+    bot = create_bot(config)
+    
+    # Migrations run while getMe and the handler imports are in flight
+    try:
+        routers = await warm_up(config, bot, db, profile, pool=config.bot.workers == 0)
+    except BaseException:
+        await bot.session.close()
+        raise
+    
+    if config.bot.workers > 0:
+        # Workers open their own pools
+        await db.engine.dispose()
+        await run_ingress_process(config, bot, routers, profile)
+        return
+    
+    with profile.phase("dispatcher"):
+        dp = await create_dispatcher(config, bot, db, routers=routers)
+    dp.startup.register(profile.ready)
     
     # Start bot
-    logger.info("Starting bot...")
+    logger.info(f"Starting bot in {config.bot.run_mode} mode...")
+    metrics_runner = None
+    try:
+        if config.metrics.enabled:
+            # Never on the public webhook server
+            metrics_runner = await start_metrics_server(config.metrics.host, config.metrics.port)
+            logger.info(f"Metrics served on {config.metrics.host}:{config.metrics.port}/metrics")
+        if config.bot.run_mode == "webhook":
+            await run_webhook(dp, bot, config.webhook)
+        else:
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await close_dispatcher(dp)
+        await bot.session.close()
+        logger.info("Bot stopped")
+
+
+async def run_ingress_process(config: Config, bot: Bot, routers: list[Router], profile: StartupProfile):
+    """Receive updates and fan them out to worker processes"""
+    # Only used to find out which update types the routers handle
+    dp = Dispatcher()
+    include_routers(dp, routers)
+    pool = WorkerPool(config.bot.workers)
+    logger.info(f"Starting {config.bot.workers} workers, receiving updates via {config.bot.run_mode}...")
+    await profile.ready()
     try:
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        await run_ingress(pool, bot, config.bot.run_mode, config.webhook, dp.resolve_used_update_types())
     finally:
         await bot.session.close()
         logger.info("Bot stopped")
 
 
+async def run_worker(index: int, count: int, profile: StartupProfile):
+    """Handle the updates of one shard, as fed by the ingress process"""
+    profile.record("imports", STARTED, IMPORTED)
+    with profile.phase("config"):
+        config = load_config()
+    profile.enabled = profile.enabled or config.bot.startup_profile
+    db = Database.from_config(config.db)
+    if config.metrics.enabled:
+        instrument_database(db)
+    bot = create_bot(config)
+    try:
+        # The ingress process has already applied the migrations
+        routers = await warm_up(config, bot, db, profile, migrate=False)
+    except BaseException:
+        await bot.session.close()
+        raise
+    with profile.phase("dispatcher"):
+        dp = await create_dispatcher(
+            config,
+            bot,
+            db,
+            owns_chat=lambda chat_id: chat_id % count == index,
+            routers=routers
+        )
+    
+    metrics_runner = None
+    if config.metrics.enabled:
+        # One port per worker, starting at METRICS_PORT
+        metrics_runner = await start_metrics_server(config.metrics.host, config.metrics.port + index)
+    try:
+        await dp.emit_startup(bot=bot, **dp.workflow_data)
+        await profile.ready()
+        await run_worker_loop(lambda update: dp.feed_raw_update(bot, update), index, count)
+    finally:
+        await dp.emit_shutdown(bot=bot, **dp.workflow_data)
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await close_dispatcher(dp)
+        await bot.session.close()
+        await db.engine.dispose()
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Telegram support bot")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workers", type=int, help=argparse.SUPPRESS)
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="log how long each startup phase took (same as STARTUP_PROFILE=1)"
+    )
+    args = parser.parse_args()
+    profile = StartupProfile(STARTED, enabled=args.profile_startup)
+    if args.worker is not None:
+        asyncio.run(run_worker(args.worker, args.workers, profile))
+        raise SystemExit
+    
     try:
-        asyncio.run(main())
+        asyncio.run(main(profile))
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
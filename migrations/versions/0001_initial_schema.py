@@ -0,0 +1,86 @@
+"""Initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 12:00:00
+
+Databases created before migrations were introduced already have these
+tables (from `metadata.create_all`), so each one is only created when
+missing.
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+# SQLite only auto-increments INTEGER primary keys
+BigIntegerPK = sa.BigInteger().with_variant(sa.Integer(), "sqlite")
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if context.is_offline_mode():
+        existing = set()
+    else:
+        existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", BigIntegerPK, primary_key=True),
+            sa.Column("telegram_id", sa.BigInteger(), nullable=False, unique=True),
+            sa.Column("username", sa.String(255), nullable=True),
+            sa.Column("first_name", sa.String(255), nullable=True),
+            sa.Column("last_name", sa.String(255), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("is_active", sa.Boolean(), nullable=False),
+        )
+
+    if "support_tickets" not in existing:
+        op.create_table(
+            "support_tickets",
+            sa.Column("id", BigIntegerPK, primary_key=True, autoincrement=True),
+            sa.Column("user_id", sa.BigInteger(), nullable=False),
+            sa.Column("subject", sa.String(255), nullable=False),
+            sa.Column("description", sa.Text(), nullable=False),
+            sa.Column("contact_info", sa.String(255), nullable=True),
+            sa.Column("status", sa.String(50), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+        )
+
+    if "broadcast_jobs" not in existing:
+        op.create_table(
+            "broadcast_jobs",
+            sa.Column("id", BigIntegerPK, primary_key=True, autoincrement=True),
+            sa.Column("admin_chat_id", sa.BigInteger(), nullable=False),
+            sa.Column("status_message_id", sa.BigInteger(), nullable=True),
+            sa.Column("payload", sa.JSON(), nullable=False),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("total", sa.Integer(), nullable=False),
+            sa.Column("sent", sa.Integer(), nullable=False),
+            sa.Column("failed", sa.Integer(), nullable=False),
+            sa.Column("last_telegram_id", sa.BigInteger(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+        )
+
+    if "broadcast_deliveries" not in existing:
+        op.create_table(
+            "broadcast_deliveries",
+            sa.Column("job_id", sa.BigInteger(), primary_key=True),
+            sa.Column("telegram_id", sa.BigInteger(), primary_key=True),
+            sa.Column("status", sa.String(20), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("broadcast_deliveries")
+    op.drop_table("broadcast_jobs")
+    op.drop_table("support_tickets")
+    op.drop_table("users")
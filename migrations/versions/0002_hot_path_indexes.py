@@ -0,0 +1,46 @@
+"""Indexes for the hot query paths
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:10:00
+
+- users (is_active, telegram_id): keyset scan of active users for broadcasts
+- support_tickets (user_id, created_at): per-user ticket lookups
+- support_tickets (status, created_at, id): ticket queues by status
+- support_tickets (created_at, id) WHERE status = 'open': open ticket queue
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_users_active_telegram_id", "users", ["is_active", "telegram_id"])
+    op.create_index("ix_support_tickets_user_created", "support_tickets", ["user_id", "created_at"])
+    op.create_index(
+        "ix_support_tickets_status_created",
+        "support_tickets",
+        ["status", "created_at", "id"]
+    )
+    op.create_index(
+        "ix_support_tickets_open",
+        "support_tickets",
+        ["created_at", "id"],
+        postgresql_where=sa.text("status = 'open'"),
+        sqlite_where=sa.text("status = 'open'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_support_tickets_open", table_name="support_tickets")
+    op.drop_index("ix_support_tickets_status_created", table_name="support_tickets")
+    op.drop_index("ix_support_tickets_user_created", table_name="support_tickets")
+    op.drop_index("ix_users_active_telegram_id", table_name="users")
@@ -0,0 +1,28 @@
+"""Ticket assignment for the admin queue
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 14:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("support_tickets", sa.Column("assigned_to", sa.BigInteger(), nullable=True))
+    op.add_column("support_tickets", sa.Column("updated_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("support_tickets", "updated_at")
+    op.drop_column("support_tickets", "assigned_to")
@@ -0,0 +1,35 @@
+"""Message mapping for the ticket relay
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 15:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ticket_messages",
+        sa.Column("chat_id", sa.BigInteger(), primary_key=True),
+        sa.Column("message_id", sa.BigInteger(), primary_key=True),
+        sa.Column("ticket_id", sa.BigInteger(), nullable=False),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("peer_message_id", sa.BigInteger(), nullable=True),
+    )
+    op.create_index("ix_ticket_messages_ticket_id", "ticket_messages", ["ticket_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ticket_messages_ticket_id", table_name="ticket_messages")
+    op.drop_table("ticket_messages")
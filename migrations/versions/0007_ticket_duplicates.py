@@ -0,0 +1,28 @@
+"""Near-duplicate grouping of support tickets
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 17:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("support_tickets", sa.Column("duplicate_of", sa.BigInteger(), nullable=True))
+    op.create_index("ix_support_tickets_duplicate_of", "support_tickets", ["duplicate_of"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_support_tickets_duplicate_of", table_name="support_tickets")
+    op.drop_column("support_tickets", "duplicate_of")
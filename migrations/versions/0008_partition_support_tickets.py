@@ -0,0 +1,140 @@
+"""Monthly range partitioning of support_tickets on created_at
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 18:00:00
+
+PostgreSQL only. The table is rebuilt as a partitioned table and the rows
+are copied over, so the upgrade holds an exclusive lock on support_tickets
+for as long as the copy takes; run it in a maintenance window on large
+tables. The primary key becomes (id, created_at), because a unique
+constraint on a partitioned table must include the partition key. No
+foreign keys reference the table. The id sequence is kept, so
+`pg_get_serial_sequence('support_tickets', 'id')` keeps working.
+
+One partition is created per month from the oldest ticket up to three
+months ahead, plus a DEFAULT partition for anything outside that range.
+Later months are created by the archiver (bot/services/archive.py).
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+COLUMNS = (
+    "id, user_id, subject, description, contact_info, status, created_at, "
+    "assigned_to, updated_at, duplicate_of"
+)
+SEARCH_VECTOR = (
+    "search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(subject, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+    ") STORED"
+)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_indexes():
+    op.create_index("ix_support_tickets_user_created", "support_tickets", ["user_id", "created_at"])
+    op.create_index(
+        "ix_support_tickets_status_created",
+        "support_tickets",
+        ["status", "created_at", "id"]
+    )
+    op.create_index(
+        "ix_support_tickets_open",
+        "support_tickets",
+        ["created_at", "id"],
+        postgresql_where=sa.text("status = 'open'")
+    )
+    op.create_index("ix_support_tickets_duplicate_of", "support_tickets", ["duplicate_of"])
+    op.execute("CREATE INDEX ix_support_tickets_search ON support_tickets USING gin (search_vector)")
+
+
+def drop_indexes():
+    for name in (
+        "ix_support_tickets_user_created",
+        "ix_support_tickets_status_created",
+        "ix_support_tickets_open",
+        "ix_support_tickets_duplicate_of",
+        "ix_support_tickets_search",
+    ):
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def rebuild_table(partitioned: bool, create_partitions=None):
+    """Recreate support_tickets (partitioned or not) and copy the rows over"""
+    old = "support_tickets_unpartitioned" if partitioned else "support_tickets_partitioned"
+    bind = op.get_bind()
+    op.execute("LOCK TABLE support_tickets IN ACCESS EXCLUSIVE MODE")
+    op.execute(f"ALTER TABLE support_tickets RENAME TO {old}")
+    op.execute(f"ALTER TABLE {old} RENAME CONSTRAINT support_tickets_pkey TO {old}_pkey")
+    drop_indexes()
+    sequence = bind.execute(sa.text(f"SELECT pg_get_serial_sequence('{old}', 'id')")).scalar_one()
+
+    op.execute(f"""
+        CREATE TABLE support_tickets (
+            id bigint NOT NULL DEFAULT nextval('{sequence}'::regclass),
+            user_id bigint NOT NULL,
+            subject varchar(255) NOT NULL,
+            description text NOT NULL,
+            contact_info varchar(255),
+            status varchar(50) NOT NULL,
+            created_at timestamp without time zone NOT NULL,
+            assigned_to bigint,
+            updated_at timestamp without time zone,
+            duplicate_of bigint,
+            {SEARCH_VECTOR},
+            CONSTRAINT support_tickets_pkey PRIMARY KEY ({"id, created_at" if partitioned else "id"})
+        ){" PARTITION BY RANGE (created_at)" if partitioned else ""}
+    """)
+    if create_partitions is not None:
+        create_partitions()
+
+    op.execute(f"INSERT INTO support_tickets ({COLUMNS}) SELECT {COLUMNS} FROM {old}")
+    # Hand the sequence over first, dropping the old table would otherwise take it along
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY support_tickets.id")
+    # Dropping a partitioned table drops its partitions too
+    op.execute(f"DROP TABLE {old}")
+    create_indexes()
+
+
+def upgrade() -> None:
+    # SQLite has no table partitioning; there archival alone keeps the table small
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    oldest = op.get_bind().execute(sa.text("SELECT min(created_at) FROM support_tickets")).scalar()
+    this_month = datetime.utcnow().date().replace(day=1)
+    first = min(oldest.date().replace(day=1), this_month) if oldest else this_month
+
+    def create_partitions():
+        month = first
+        while month <= add_months(this_month, MONTHS_AHEAD):
+            following = add_months(month, 1)
+            op.execute(
+                f"CREATE TABLE support_tickets_p{month:%Y%m} PARTITION OF support_tickets "
+                f"FOR VALUES FROM ('{month}') TO ('{following}')"
+            )
+            month = following
+        op.execute("CREATE TABLE support_tickets_default PARTITION OF support_tickets DEFAULT")
+
+    rebuild_table(partitioned=True, create_partitions=create_partitions)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    rebuild_table(partitioned=False)
@@ -0,0 +1,33 @@
+"""Ticket SLA deadlines
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 19:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ticket_deadlines",
+        sa.Column("ticket_id", sa.BigInteger(), primary_key=True),
+        sa.Column("kind", sa.String(length=20), primary_key=True),
+        sa.Column("due_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_ticket_deadlines_due_at", "ticket_deadlines", ["due_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ticket_deadlines_due_at", table_name="ticket_deadlines")
+    op.drop_table("ticket_deadlines")
@@ -0,0 +1,28 @@
+"""Leases on broadcast jobs
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("broadcast_jobs", sa.Column("owner", sa.String(length=100), nullable=True))
+    op.add_column("broadcast_jobs", sa.Column("lease_until", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("broadcast_jobs", "lease_until")
+    op.drop_column("broadcast_jobs", "owner")
@@ -0,0 +1,30 @@
+"""Cross-process broadcast control and user deactivation tracking
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("broadcast_jobs", sa.Column("stop_requested", sa.String(length=20), nullable=True))
+    op.add_column("users", sa.Column("deactivated_at", sa.DateTime(), nullable=True))
+    op.create_index("ix_users_deactivated_at", "users", ["deactivated_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_deactivated_at", table_name="users")
+    op.drop_column("users", "deactivated_at")
+    op.drop_column("broadcast_jobs", "stop_requested")
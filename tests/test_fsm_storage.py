@@ -0,0 +1,109 @@
+"""FSM storage backends, built through create_storage() as the bot does.
+
+The redis backend runs against a local server when TEST_REDIS_URL is set,
+and against fakeredis otherwise; without either it is skipped.
+"""
+import asyncio
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+
+from bot.fsm_storage import DatabaseStorage, create_storage
+from config import FSMConfig
+from database import Database
+
+
+class Form(StatesGroup):
+    waiting = State()
+
+
+async def exercise(storage):
+    key = StorageKey(bot_id=1, chat_id=42, user_id=42)
+    context = FSMContext(storage=storage, key=key)
+
+    await context.set_state(Form.waiting)
+    await context.update_data(subject="Printer on fire", step=2)
+    assert await context.get_state() == Form.waiting.state
+    assert await context.get_data() == {"subject": "Printer on fire", "step": 2}
+
+    # Another user's state is kept apart
+    other = FSMContext(storage=storage, key=StorageKey(bot_id=1, chat_id=7, user_id=7))
+    assert await other.get_state() is None
+    assert await other.get_data() == {}
+
+    await context.clear()
+    assert await context.get_state() is None
+    assert await context.get_data() == {}
+
+
+def run_backend(backend: str, redis_url: str = "redis://localhost:6379/0"):
+    async def scenario():
+        workdir = tempfile.TemporaryDirectory()
+        db = Database(f"sqlite+aiosqlite:///{Path(workdir.name) / 'fsm.db'}")
+        await db.create_tables()
+        storage = create_storage(FSMConfig(backend=backend, redis_url=redis_url), db.session_maker)
+        try:
+            await exercise(storage)
+        finally:
+            await storage.close()
+            await db.engine.dispose()
+            workdir.cleanup()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("backend", ["memory", "database"])
+def test_local_backends(backend):
+    run_backend(backend)
+
+
+def test_database_backend_cache():
+    async def scenario():
+        workdir = tempfile.TemporaryDirectory()
+        db = Database(f"sqlite+aiosqlite:///{Path(workdir.name) / 'fsm.db'}")
+        await db.create_tables()
+        cached = DatabaseStorage(db.session_maker)
+        uncached = DatabaseStorage(db.session_maker, cache_ttl=0)
+        key = StorageKey(bot_id=1, chat_id=42, user_id=42)
+        try:
+            # Caches the missing record
+            assert await cached.get_state(key) is None
+
+            await cached.set_state(key, Form.waiting)
+            await cached.flush()
+            assert await cached.get_state(key) == Form.waiting.state
+            assert await uncached.get_state(key) == Form.waiting.state
+
+            # Without a cache, another process's change shows as soon as it is flushed
+            await cached.set_state(key, None)
+            await cached.flush()
+            assert await uncached.get_state(key) is None
+        finally:
+            await cached.close()
+            await uncached.close()
+            await db.engine.dispose()
+            workdir.cleanup()
+
+    asyncio.run(scenario())
+
+
+def test_redis_backend(monkeypatch):
+    pytest.importorskip("redis")
+    redis_url = os.getenv("TEST_REDIS_URL")
+    if redis_url is None:
+        fakeredis = pytest.importorskip("fakeredis")
+        from fakeredis.aioredis import FakeAsyncRedisConnection
+        from redis.asyncio import ConnectionPool
+
+        server = fakeredis.FakeServer()
+        monkeypatch.setattr(
+            "aiogram.fsm.storage.redis.ConnectionPool.from_url",
+            lambda url, **kwargs: ConnectionPool(connection_class=FakeAsyncRedisConnection, server=server)
+        )
+        redis_url = "redis://localhost:6379/0"
+    run_backend("redis", redis_url)
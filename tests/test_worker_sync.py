@@ -0,0 +1,87 @@
+"""State shared between worker processes through the database.
+
+Each test uses two service instances on one SQLite database, standing in
+for two workers.
+"""
+import asyncio
+import tempfile
+from pathlib import Path
+
+from sqlalchemy import insert
+
+from bot.services import users
+from bot.services.broadcast import Broadcaster, deactivate_users_statement
+from bot.services.duplicates import DuplicateDetector
+from bot.services.users import UserCacheSync
+from database import Database
+from database.models import BroadcastJob, SupportTicket, User
+
+
+def run_with_database(scenario):
+    async def main():
+        workdir = tempfile.TemporaryDirectory()
+        db = Database(f"sqlite+aiosqlite:///{Path(workdir.name) / 'bot.db'}")
+        await db.create_tables()
+        try:
+            await scenario(db)
+        finally:
+            await db.engine.dispose()
+            workdir.cleanup()
+
+    asyncio.run(main())
+
+
+def test_pause_reaches_the_delivering_worker():
+    async def scenario(db: Database):
+        async with db.session_maker() as session:
+            job = BroadcastJob(admin_chat_id=1, payload={"kind": "message", "text": "Hi"}, status="running", owner="other")
+            session.add(job)
+            await session.commit()
+            job_id = job.id
+
+        broadcaster = Broadcaster(None, db.session_maker)
+        assert await broadcaster.pause(job_id)
+        async with db.session_maker() as session:
+            job = await session.get(BroadcastJob, job_id)
+        # Left to the owner, which stops at its next checkpoint
+        assert job.status == "running"
+        assert job.stop_requested == "paused"
+
+    run_with_database(scenario)
+
+
+def test_deactivated_users_leave_every_cache():
+    async def scenario(db: Database):
+        async with db.session_maker() as session:
+            await session.execute(insert(User).values(telegram_id=5, is_active=True))
+            await session.commit()
+        users._known_users.set(5, ("someone", "Some", None))
+
+        sync = UserCacheSync(db.session_maker)
+        async with db.session_maker() as session:
+            await session.execute(deactivate_users_statement([5], "sqlite"))
+            await session.commit()
+        assert await sync.sync() == 1
+        assert users._known_users.get(5) is None
+
+    run_with_database(scenario)
+
+
+def test_duplicates_created_by_another_worker_are_found():
+    async def scenario(db: Database):
+        subject, description = "Cannot log in", "The password reset link never arrives in my inbox"
+        detector = DuplicateDetector()
+        await detector.start(db.session_maker)
+        try:
+            async with db.session_maker() as session:
+                ticket = SupportTicket(user_id=5, subject=subject, description=description)
+                session.add(ticket)
+                await session.commit()
+            assert detector.find(subject, description) is None
+
+            await detector.load_recent(db.session_maker)
+            assert detector.find(subject, description) == ticket.id
+        finally:
+            await detector.close()
+
+    run_with_database(scenario)